@@ -0,0 +1,90 @@
+'''
+    Benchmarks
+    ~~~~~~~~~~
+    Micro-benchmarks for the hot paths of caliper. Run the suite with
+    ``python -m benchmarks``, see ``python -m benchmarks --help`` for the
+    options to write and compare JSON results.
+
+    Benchmarks live in the ``bench_*`` modules of this package and register
+    themselves with one of two decorators:
+
+    * :func:`benchmark` wraps a function that does its setup and returns a
+      callable, the callable is timed and reported in nanoseconds per call.
+      The function may also return a ``(callable, teardown)`` pair, `teardown`
+      is called once timing is done.
+    * :func:`measure` wraps a function that returns a single measurement in
+      `unit` itself, for figures that can't be expressed as a timed loop.
+
+    For both kinds lower is better, which is what the comparison mode assumes.
+'''
+
+import timeit
+
+
+BENCHMARKS = []
+
+
+class Benchmark(object):
+
+    def __init__(self, name, func, unit, timed):
+        self.name = name
+        self.func = func
+        self.unit = unit
+        self.timed = timed
+
+    def run(self, repeat):
+        ''' Run the benchmark `repeat` times and return the best result. '''
+        if not self.timed:
+            return min(self.func() for _ in range(repeat))
+
+        op = self.func()
+        teardown = None
+        if isinstance(op, tuple):
+            op, teardown = op
+
+        try:
+            timer = timeit.Timer(op)
+            number, _ = timer.autorange()
+            best = min(timer.repeat(repeat=repeat, number=number))
+        finally:
+            if teardown is not None:
+                teardown()
+        return best / number * 1e9
+
+
+def benchmark(name):
+    ''' Register a timed benchmark, reported in ``ns/op``. '''
+    def decorator(func):
+        BENCHMARKS.append(Benchmark(name, func, 'ns/op', timed=True))
+        return func
+    return decorator
+
+
+def measure(name, unit):
+    ''' Register a benchmark that measures and returns a value in `unit`. '''
+    def decorator(func):
+        BENCHMARKS.append(Benchmark(name, func, unit, timed=False))
+        return func
+    return decorator
+
+
+def compare(results, baseline, threshold):
+    ''' Compare `results` with `baseline`.
+
+    :param results: Mapping of benchmark name to ``{'value': ..., 'unit': ...}``.
+    :param baseline: A mapping with the same layout, usually loaded from a
+                     previous run.
+    :param threshold: Maximum allowed relative slowdown, ``0.1`` allows results
+                      to be 10% worse than the baseline.
+    :returns: List of ``(name, baseline, result, ratio, regressed)`` tuples for
+              every benchmark present in both mappings.
+    '''
+    rows = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old = baseline[name]['value']
+        new = results[name]['value']
+        ratio = new / old if old else float('inf') if new else 1.0
+        rows.append((name, old, new, ratio, ratio > 1 + threshold))
+    return rows
@@ -0,0 +1,108 @@
+''' Command line interface of the benchmark suite. '''
+
+import argparse
+import importlib
+import json
+import pkgutil
+import platform
+import sys
+
+import benchmarks
+from benchmarks import BENCHMARKS, compare
+
+
+def load_modules():
+    for _, name, _ in pkgutil.iter_modules(benchmarks.__path__):
+        if name.startswith('bench_'):
+            importlib.import_module('benchmarks.%s' % name)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Run the caliper benchmarks.')
+    parser.add_argument('-k', '--filter', action='append', default=[],
+                        help='Only run benchmarks whose name contains FILTER, '
+                             'may be given more than once.')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='Number of repetitions, the best one is reported.')
+    parser.add_argument('--json', metavar='PATH',
+                        help="Write the results as JSON to PATH ('-' for stdout).")
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='Compare the results with a JSON file written by --json.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative slowdown that counts as a regression '
+                             '(default: 0.1).')
+    parser.add_argument('-l', '--list', action='store_true',
+                        help='List the benchmarks and exit.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_modules()
+
+    selected = [b for b in BENCHMARKS
+                if not args.filter or any(f in b.name for f in args.filter)]
+
+    if args.list:
+        for bench in selected:
+            print(bench.name)
+        return 0
+
+    out = sys.stderr if args.json == '-' else sys.stdout
+    results = run(selected, args.repeat, out)
+    if args.json:
+        write_json(results, args.json)
+    if args.compare and report_regressions(results, args.compare, args.threshold, out):
+        return 1
+    return 0
+
+
+def run(selected, repeat, out):
+    ''' Runs the `selected` benchmarks and writes a line per benchmark to `out`. '''
+    results = {}
+    for bench in selected:
+        value = bench.run(repeat)
+        results[bench.name] = {'value': value, 'unit': bench.unit}
+        out.write('%-50s %14.1f %s\n' % (bench.name, value, bench.unit))
+        out.flush()
+    return results
+
+
+def write_json(results, path):
+    document = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'results': results,
+    }
+    if path == '-':
+        json.dump(document, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(path, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+
+
+def report_regressions(results, path, threshold, out):
+    ''' Writes the comparison of `results` with the baseline at `path` to `out`.
+
+    :returns: The number of regressions.
+    '''
+    with open(path) as f:
+        baseline = json.load(f)['results']
+
+    regressions = 0
+    out.write('\n%-50s %14s %14s %8s\n' % ('benchmark', 'baseline', 'current',
+                                           'ratio'))
+    for name, old, new, ratio, regressed in compare(results, baseline, threshold):
+        regressions += regressed
+        out.write('%-50s %14.1f %14.1f %7.2fx%s\n' % (
+            name, old, new, ratio, '  REGRESSION' if regressed else ''))
+
+    if regressions:
+        out.write('\n%d regression(s) above %.0f%%\n' % (regressions, threshold * 100))
+    return regressions
+
+
+if __name__ == '__main__':
+    sys.exit(main())
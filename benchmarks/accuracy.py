@@ -0,0 +1,230 @@
+'''
+    Accuracy
+    ~~~~~~~~
+    Replays synthetic streams through the sampling reservoirs and compares the
+    quantiles they report with the exact quantiles of the whole stream. Run it
+    with ``python -m benchmarks.accuracy``.
+
+    Everything but the update cost is deterministic for a given ``--seed``: the
+    streams are generated from a seeded RNG, every reservoir is given its own
+    RNG seeded with the same seed and the exponentially decaying reservoirs are fed
+    synthetic timestamps spread evenly over ``--duration`` seconds.
+
+    For every stream and reservoir the tool reports, per quantile, the relative
+    error of the value and the rank error (the fraction of the stream that lies
+    between the reported and the exact quantile), together with the approximate
+    memory held by the reservoir and the mean cost of an update.
+'''
+
+import argparse
+import json
+import random
+import sys
+import timeit
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from caliper.reservoir import (
+    ExponentiallyDecayingReservoir,
+    LogExponentiallyDecayingReservoir,
+    SlidingWindowReservoir,
+    UniformReservoir,
+)
+from caliper.snapshot import Snapshot
+
+
+QUANTILES = (0.5, 0.75, 0.9, 0.99, 0.999)
+
+
+# Streams, every stream is a function that takes an RNG and a length and returns
+# a list of values with a latency-like distribution (in seconds).
+
+def uniform(rng, n):
+    return [rng.uniform(0.0, 1.0) for _ in range(n)]
+
+
+def lognormal(rng, n):
+    return [rng.lognormvariate(-4.0, 1.0) for _ in range(n)]
+
+
+def bimodal(rng, n):
+    ''' A fast path (cache hits) and a slow path taken 10% of the time. '''
+    return [abs(rng.gauss(0.2, 0.03)) if rng.random() < 0.1 else
+            abs(rng.gauss(0.02, 0.005)) for _ in range(n)]
+
+
+def bursty(rng, n):
+    ''' Lognormal with a burst of ten times slower values every 1000 values. '''
+    return [rng.lognormvariate(-4.0, 0.5) * (10 if i % 1000 >= 900 else 1)
+            for i in range(n)]
+
+
+def shifting(rng, n):
+    ''' Lognormal that becomes four times slower halfway through the stream. '''
+    return [rng.lognormvariate(-4.0 if i < n // 2 else -4.0 + 1.386, 0.5)
+            for i in range(n)]
+
+
+STREAMS = {
+    'uniform': uniform,
+    'lognormal': lognormal,
+    'bimodal': bimodal,
+    'bursty': bursty,
+    'shifting': shifting,
+}
+
+
+RESERVOIRS = [
+    ('SlidingWindowReservoir(1028)', lambda rng: SlidingWindowReservoir(1028)),
+    ('UniformReservoir(128)', lambda rng: UniformReservoir(128, rng=rng)),
+    ('UniformReservoir(1028)', lambda rng: UniformReservoir(1028, rng=rng)),
+    ('UniformReservoir(4096)', lambda rng: UniformReservoir(4096, rng=rng)),
+    ('ExponentiallyDecayingReservoir(1028, 0.005)',
+     lambda rng: ExponentiallyDecayingReservoir(1028, 0.005, rng=rng)),
+    ('ExponentiallyDecayingReservoir(1028, 0.015)',
+     lambda rng: ExponentiallyDecayingReservoir(1028, 0.015, rng=rng)),
+    ('ExponentiallyDecayingReservoir(1028, 0.05)',
+     lambda rng: ExponentiallyDecayingReservoir(1028, 0.05, rng=rng)),
+    ('LogExponentiallyDecayingReservoir(1028, 0.015)',
+     lambda rng: LogExponentiallyDecayingReservoir(1028, 0.015, rng=rng)),
+]
+
+
+def sizeof(obj, _seen=None):
+    ''' Approximate number of bytes held by `obj` and the containers in it. '''
+    _seen = _seen if _seen is not None else set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sizeof(k, _seen) + sizeof(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(sizeof(x, _seen) for x in obj)
+    elif hasattr(obj, '__dict__'):
+        size += sizeof(vars(obj), _seen)
+    return size
+
+
+def replay(factory, values, seed, duration):
+    ''' Feed `values` to a new reservoir and return it with the mean update
+    cost in nanoseconds. '''
+    res = factory(random.Random(seed))
+
+    if isinstance(res, (ExponentiallyDecayingReservoir,
+                        LogExponentiallyDecayingReservoir)):
+        start = res._landmark
+        step = duration / float(len(values))
+        stamps = [start + timedelta(seconds=(i + 1) * step) for i in range(len(values))]
+        # The reservoir rescales on wall clock time, which must not happen
+        # in the middle of a replay.
+        res._next_rescale = datetime.max
+        began = timeit.default_timer()
+        for value, stamp in zip(values, stamps):
+            res.update(value, stamp)
+    else:
+        began = timeit.default_timer()
+        for value in values:
+            res.update(value)
+
+    elapsed = timeit.default_timer() - began
+    return res, elapsed / len(values) * 1e9
+
+
+def rank(exact, value):
+    ''' The fraction of the sorted `exact` values that lies at or below `value`,
+    halfway between ties. '''
+    lower = bisect_left(exact, value)
+    upper = bisect_right(exact, value)
+    return (lower + upper) / 2.0 / len(exact)
+
+
+def evaluate(values, res, quantiles):
+    exact = Snapshot(values)
+    snap = res.snapshot()
+    errors = {}
+    for q in quantiles:
+        true = exact.get_value(q)
+        estimate = snap.get_value(q)
+        errors[q] = {
+            'exact': true,
+            'estimate': estimate,
+            'relative_error': abs(estimate - true) / true if true else 0.0,
+            'rank_error': abs(rank(exact, estimate) - rank(exact, true)),
+        }
+    return errors
+
+
+def run(streams, n, seed, duration, quantiles):
+    report = []
+    for stream in streams:
+        values = STREAMS[stream](random.Random(seed), n)
+        for name, factory in RESERVOIRS:
+            res, cost = replay(factory, values, seed, duration)
+            report.append({
+                'stream': stream,
+                'reservoir': name,
+                'memory': sizeof(res),
+                'update_ns': cost,
+                'quantiles': evaluate(values, res, quantiles),
+            })
+    return report
+
+
+def print_report(report, quantiles, out=sys.stdout):
+    header = '%-10s %-44s %9s %9s' % ('stream', 'reservoir', 'bytes', 'ns/upd')
+    header += ''.join(' %15s' % ('p%s rel/rank' % ('%g' % (q * 100))) for q in quantiles)
+    out.write(header + '\n')
+    for row in report:
+        line = '%-10s %-44s %9d %9.0f' % (row['stream'], row['reservoir'],
+                                          row['memory'], row['update_ns'])
+        for q in quantiles:
+            err = row['quantiles'][q]
+            line += ' %7.2f%%/%5.2f%%' % (err['relative_error'] * 100,
+                                          err['rank_error'] * 100)
+        out.write(line + '\n')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.accuracy',
+                                     description='Evaluate the accuracy of the '
+                                                 'sampling reservoirs.')
+    parser.add_argument('-n', type=int, default=20000,
+                        help='Number of values per stream (default: 20000).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--duration', type=float, default=300.0,
+                        help='Seconds of synthetic time a stream spans for the '
+                             'decaying reservoirs (default: 300).')
+    parser.add_argument('-s', '--stream', action='append', choices=sorted(STREAMS),
+                        help='Stream to replay, may be given more than once '
+                             '(default: all).')
+    parser.add_argument('-q', '--quantiles',
+                        default=','.join('%g' % q for q in QUANTILES),
+                        help='Comma separated quantiles to evaluate.')
+    parser.add_argument('--json', metavar='PATH',
+                        help="Write the report as JSON to PATH ('-' for stdout).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    quantiles = [float(q) for q in args.quantiles.split(',')]
+    streams = args.stream or sorted(STREAMS)
+
+    report = run(streams, args.n, args.seed, args.duration, quantiles)
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        print_report(report, quantiles)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+from caliper.alerting import AlertEngine, ThresholdRule
+from caliper.metric import Counter, Timer
+from caliper.registry import Registry
+from caliper.reservoir import SlidingWindowReservoir
+
+from benchmarks import benchmark
+
+
+def register(rules, metrics):
+
+    @benchmark('alerting.evaluate.rules.%d.metrics.%d' % (rules, metrics))
+    def evaluate():
+        ''' Evaluate `rules` p99 rules against a registry that holds `metrics` other
+        metrics, the cost should not depend on the latter. '''
+        registry = Registry()
+        for i in range(metrics):
+            registry.get_or_create_metric(Counter, 'other%d' % i)
+        engine = AlertEngine(registry)
+        for i in range(rules):
+            timer = registry.get_or_create_metric(Timer, 'db.query%d' % i,
+                                                  SlidingWindowReservoir(100))
+            for value in range(100):
+                timer.update(value / 1000.0)
+            engine.add(ThresholdRule('slow', Timer, 'db.query%d' % i, 'p99', '>', 0.2))
+        return engine.evaluate
+
+
+for rules in (10, 100):
+    for metrics in (0, 10000):
+        register(rules, metrics)
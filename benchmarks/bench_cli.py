@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import timeit
+from random import Random
+
+from caliper.cli import Options, analyze
+
+from benchmarks import measure
+
+
+LINES = 400000
+ENDPOINTS = ['/users', '/groups', '/login', '/logout', '/search']
+
+
+def access_log(directory):
+    ''' Writes a synthetic access log of `LINES` lines to `directory`. '''
+    rng = Random(42)
+    path = os.path.join(directory, 'access.log')
+    with open(path, 'w') as f:
+        for _ in range(LINES):
+            f.write('10.0.0.1 - - [18/Oct/2026:12:00:00] "GET %s HTTP/1.1" 200 %d\n' % (
+                rng.choice(ENDPOINTS), int(rng.lognormvariate(3, 1))))
+    return path
+
+
+def register(jobs):
+
+    @measure('cli.analyze.jobs.%d' % jobs, 'ns/line')
+    def analyze_log():
+        ''' Time per line of analyzing the log with `jobs` processes, on a machine
+        with at least `jobs` cores this should drop about linearly. '''
+        directory = tempfile.mkdtemp()
+        try:
+            path = access_log(directory)
+            shard_size = os.path.getsize(path) // (4 * jobs) + 1
+            # Keyed by the endpoint, the sixth field, so lines are spread over keys.
+            options = Options(5, -1, None, 1.0, 10000, 'benchmark')
+            began = timeit.default_timer()
+            analyze([path], options, jobs, shard_size)
+            return (timeit.default_timer() - began) / LINES * 1e9
+        finally:
+            shutil.rmtree(directory)
+
+
+for jobs in (1, 2, 4):
+    register(jobs)
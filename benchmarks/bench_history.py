@@ -0,0 +1,40 @@
+from caliper.history import History
+from caliper.metric import Timer
+from caliper.registry import Registry
+from caliper.reservoir import SlidingWindowReservoir
+
+from benchmarks import benchmark, measure
+from benchmarks.bench_metric import allocated
+
+
+def timers(n):
+    registry = Registry()
+    for i in range(n):
+        timer = registry.get_or_create_metric(Timer, 'db.query%d' % i,
+                                              SlidingWindowReservoir())
+        for value in range(100):
+            timer.update(value / 1000.0)
+    return registry
+
+
+@benchmark('history.record.timers.100')
+def record():
+    history = History(timers(100))
+    clock = iter(range(0, 10 ** 9, 10))
+    return lambda: history.record(now=next(clock))
+
+
+@benchmark('history.query.1h')
+def query():
+    registry = timers(1)
+    history = History(registry)
+    for now in range(0, 86400, 10):
+        history.record(now=now)
+    return lambda: history.query(Timer, 'db.query0', 'p99', 86400 - 3600)
+
+
+@measure('history.memory.timer', 'bytes')
+def memory():
+    registry = timers(1)
+    history = History(registry)
+    return allocated(lambda: history._create_series(registry.items()[0][2]), 10)
@@ -0,0 +1,28 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import measure
+
+
+@measure('import.caliper', 'us')
+def import_caliper():
+    ''' Cumulative time of ``import caliper`` according to ``python -X importtime``,
+    with warm bytecode caches. '''
+    cache = tempfile.mkdtemp()
+    try:
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=cache)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        command = [sys.executable, '-X', 'importtime', '-c', 'import caliper']
+        subprocess.check_output(command, stderr=subprocess.STDOUT, env=env)
+        output = subprocess.check_output(command, stderr=subprocess.STDOUT, env=env)
+    finally:
+        shutil.rmtree(cache)
+
+    for line in output.decode().splitlines():
+        fields = [f.strip() for f in line.split('|')]
+        if len(fields) == 3 and fields[2] == 'caliper':
+            return float(fields[1])
+    raise RuntimeError('caliper not found in the output of -X importtime')
@@ -0,0 +1,34 @@
+from caliper.instrument import Instrumenter
+from caliper.registry import Registry
+
+from benchmarks import benchmark
+
+
+def func():
+    pass
+
+
+@benchmark('instrument.call.baseline')
+def call_baseline():
+    return func
+
+
+def register(sample_every):
+
+    @benchmark('instrument.call.timed.sample_every.%d' % sample_every)
+    def call_timed():
+        instrumenter = Instrumenter([__name__], sample_every=sample_every,
+                                    registry=Registry())
+        instrumenter.start()
+        return func, instrumenter.stop
+
+
+for sample_every in (1, 10, 100):
+    register(sample_every)
+
+
+@benchmark('instrument.call.not_selected')
+def call_not_selected():
+    instrumenter = Instrumenter(['benchmarks.nothing'], registry=Registry())
+    instrumenter.start()
+    return func, instrumenter.stop
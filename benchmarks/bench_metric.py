@@ -0,0 +1,120 @@
+import tracemalloc
+
+from caliper.metric import Counter, Histogram, Meter, Timer
+from caliper.reservoir import SlidingWindowReservoir
+
+from benchmarks import benchmark, measure
+
+
+@benchmark('metric.counter.inc')
+def counter_inc():
+    return Counter().inc
+
+
+@benchmark('metric.meter.mark')
+def meter_mark():
+    return Meter().mark
+
+
+@benchmark('metric.histogram.update')
+def histogram_update():
+    histogram = Histogram()
+    return lambda: histogram.update(0.042)
+
+
+@benchmark('metric.timer.update')
+def timer_update():
+    timer = Timer()
+    return lambda: timer.update(0.042)
+
+
+@benchmark('metric.timer.time')
+def timer_time():
+    timer = Timer()
+
+    def op():
+        with timer.time():
+            pass
+    return op
+
+
+@benchmark('metric.timer.time.baseline')
+def timer_time_baseline():
+    ''' The cost of the empty block timed by ``metric.timer.time``. '''
+    def op():
+        pass
+    return op
+
+
+def register_sampling(sample_every):
+
+    @benchmark('metric.timer.time.sample_every.%d' % sample_every)
+    def timer_time_sampled():
+        timer = Timer(sample_every=sample_every)
+
+        def op():
+            with timer.time():
+                pass
+        return op
+
+
+for sample_every in (1, 10, 100, 1000):
+    register_sampling(sample_every)
+
+
+@benchmark('metric.timer.time.overhead_budget.1%')
+def timer_time_budget():
+    timer = Timer(overhead_budget=0.01)
+
+    def op():
+        with timer.time():
+            pass
+    return op
+
+
+def allocated(factory, n=100):
+    ''' The mean number of bytes allocated by each of `n` calls to `factory`. '''
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = [factory() for _ in range(n)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del objects
+    return (after - before) / float(n)
+
+
+@measure('metric.timer.memory', 'bytes')
+def timer_memory():
+    return allocated(Timer)
+
+
+@measure('metric.histogram.memory', 'bytes')
+def histogram_memory():
+    return allocated(Histogram)
+
+
+def nested(timers):
+    ''' Returns an op that enters a context of each of `timers`, one inside the other. '''
+    def op(depth=0):
+        if depth < len(timers):
+            with timers[depth].time():
+                op(depth + 1)
+    return op
+
+
+def register_nesting(depth):
+
+    @benchmark('metric.timer.time.depth.%d' % depth)
+    def timer_time_nested():
+        return nested([Timer(SlidingWindowReservoir()) for _ in range(depth)])
+
+    @benchmark('metric.timer.span.depth.%d' % depth)
+    def timer_span_nested():
+        return nested([Timer(SlidingWindowReservoir(), spans=SlidingWindowReservoir())
+                       for _ in range(depth)])
+
+
+for depth in (1, 2, 3, 5, 10):
+    register_nesting(depth)
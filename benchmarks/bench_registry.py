@@ -0,0 +1,63 @@
+from itertools import count
+
+import caliper
+from caliper.metric import Counter, Timer
+from caliper.registry import Registry
+from caliper.reservoir import SlidingWindowReservoir
+
+from benchmarks import benchmark
+
+
+@benchmark('registry.counter.lookup')
+def counter_lookup():
+    caliper.counter('benchmarks.registry.counter')
+    return lambda: caliper.counter('benchmarks.registry.counter')
+
+
+@benchmark('registry.timer.lookup')
+def timer_lookup():
+    caliper.timer('benchmarks.registry.timer')
+    return lambda: caliper.timer('benchmarks.registry.timer')
+
+
+@benchmark('registry.timer.lookup.labelled')
+def labelled_timer_lookup():
+    caliper.timer('benchmarks.registry.timer', handler='users', status=200)
+    return lambda: caliper.timer('benchmarks.registry.timer', handler='users', status=200)
+
+
+@benchmark('registry.sweep.1000')
+def sweep():
+    registry = Registry(idle_timeout=60)
+    for i in range(1000):
+        registry.get_or_create_metric(Counter, 'benchmarks.counter%d' % i)
+    return registry.sweep
+
+
+@benchmark('registry.create.evict.10000')
+def create_evict():
+    ''' Create a new metric in a full registry, which evicts another one. '''
+    registry = Registry(max_metrics=10000)
+    for i in range(10000):
+        registry.get_or_create_metric(Counter, 'benchmarks.counter%d' % i)
+    names = ('benchmarks.new%d' % i for i in count())
+    return lambda: registry.get_or_create_metric(Counter, next(names))
+
+
+def register_capture(samples):
+
+    @benchmark('registry.capture.1000%s' % ('.samples' if samples else ''))
+    def capture():
+        ''' Capture 500 counters and 500 timers with 100 samples each. '''
+        registry = Registry()
+        for i in range(500):
+            registry.get_or_create_metric(Counter, 'benchmarks.counter%d' % i).inc()
+            timer = registry.get_or_create_metric(Timer, 'benchmarks.timer%d' % i,
+                                                  SlidingWindowReservoir())
+            for _ in range(100):
+                timer.update(0.042)
+        return lambda: registry.capture(samples=samples)
+
+
+for samples in (False, True):
+    register_capture(samples)
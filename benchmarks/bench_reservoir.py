@@ -0,0 +1,93 @@
+import timeit
+from datetime import datetime
+from random import Random
+
+from caliper.reservoir import (
+    ExponentiallyDecayingReservoir,
+    LogExponentiallyDecayingReservoir,
+    Reservoir,
+    SlidingWindowReservoir,
+    UniformReservoir,
+)
+
+from benchmarks import benchmark, measure
+
+
+SIZES = (100, 1028, 10000)
+
+TAIL_QUANTILES = (0.99, 0.999)
+
+SAMPLING = (SlidingWindowReservoir, UniformReservoir, ExponentiallyDecayingReservoir,
+            LogExponentiallyDecayingReservoir)
+
+
+def filled(cls, size):
+    ''' Returns a reservoir of `cls` that has seen twice its size in values. '''
+    rng = Random(42)
+    res = cls(size)
+    for _ in range(2 * size):
+        res.update(rng.random())
+    return res
+
+
+def register(cls, size):
+    name = cls.__name__
+
+    @benchmark('reservoir.%s.update.%d' % (name, size))
+    def update():
+        res = filled(cls, size)
+        return lambda: res.update(0.042)
+
+    @benchmark('reservoir.%s.snapshot.%d' % (name, size))
+    def snapshot():
+        return filled(cls, size).snapshot
+
+    @benchmark('reservoir.%s.summary.%d' % (name, size))
+    def summary():
+        res = filled(cls, size)
+        return lambda: res.summary(TAIL_QUANTILES)
+
+
+def max_update_latency(res, updates=1000):
+    ''' The slowest of `updates` updates in nanoseconds. An exponentially
+    decaying reservoir is made to rescale halfway through. '''
+    clock = timeit.default_timer
+    worst = 0
+    for i in range(updates):
+        if i == updates // 2 and isinstance(res, ExponentiallyDecayingReservoir):
+            res._next_rescale = datetime.now()
+        began = clock()
+        res.update(0.042)
+        worst = max(worst, clock() - began)
+    return worst * 1e9
+
+
+def register_latency(cls, size):
+
+    @measure('reservoir.%s.max_update.%d' % (cls.__name__, size), 'ns')
+    def max_update():
+        return max_update_latency(filled(cls, size))
+
+
+for cls in SAMPLING:
+    for size in SIZES:
+        register(cls, size)
+
+for cls in (ExponentiallyDecayingReservoir, LogExponentiallyDecayingReservoir):
+    for size in SIZES:
+        register_latency(cls, size)
+
+
+@benchmark('reservoir.Reservoir.update')
+def reservoir_update():
+    res = Reservoir()
+    return lambda: res.update(0.042)
+
+
+@benchmark('reservoir.Reservoir.snapshot.10000')
+def reservoir_snapshot():
+    rng = Random(42)
+    res = Reservoir()
+    for _ in range(10000):
+        res.update(rng.random())
+    return res.snapshot
@@ -0,0 +1,81 @@
+from random import Random
+
+from caliper.snapshot import Snapshot, WeightedSnapshot
+
+from benchmarks import benchmark
+
+
+SIZES = (100, 1028, 10000)
+
+
+def values(size):
+    rng = Random(42)
+    return [rng.random() for _ in range(size)]
+
+
+def weighted(size):
+    rng = Random(42)
+    return [(rng.random(), rng.random()) for _ in range(size)]
+
+
+def uncached(snap, name):
+    ''' Returns a callable that computes the cached property `name` of `snap` anew,
+    together with the mean the standard deviation depends on. '''
+    cached = snap.__dict__
+
+    def compute():
+        cached.pop('mean', None)
+        cached.pop('stddev', None)
+        return getattr(snap, name)
+    return compute
+
+
+def register_snapshot(size):
+
+    @benchmark('snapshot.Snapshot.new.%d' % size)
+    def snapshot_new():
+        data = values(size)
+        return lambda: Snapshot(data)
+
+    @benchmark('snapshot.Snapshot.get_value.%d' % size)
+    def snapshot_get_value():
+        snap = Snapshot(values(size))
+        return lambda: snap.get_value(0.99)
+
+    @benchmark('snapshot.Snapshot.mean.%d' % size)
+    def snapshot_mean():
+        snap = Snapshot(values(size))
+        return uncached(snap, 'mean')
+
+    @benchmark('snapshot.Snapshot.stddev.%d' % size)
+    def snapshot_stddev():
+        snap = Snapshot(values(size))
+        return uncached(snap, 'stddev')
+
+
+def register_weighted(size):
+
+    @benchmark('snapshot.WeightedSnapshot.new.%d' % size)
+    def weighted_new():
+        data = weighted(size)
+        return lambda: WeightedSnapshot(data)
+
+    @benchmark('snapshot.WeightedSnapshot.get_value.%d' % size)
+    def weighted_get_value():
+        snap = WeightedSnapshot(weighted(size))
+        return lambda: snap.get_value(0.99)
+
+    @benchmark('snapshot.WeightedSnapshot.mean.%d' % size)
+    def weighted_mean():
+        snap = WeightedSnapshot(weighted(size))
+        return uncached(snap, 'mean')
+
+    @benchmark('snapshot.WeightedSnapshot.stddev.%d' % size)
+    def weighted_stddev():
+        snap = WeightedSnapshot(weighted(size))
+        return uncached(snap, 'stddev')
+
+
+for size in SIZES:
+    register_snapshot(size)
+    register_weighted(size)
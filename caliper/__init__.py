@@ -1,19 +1,23 @@
 from functools import partial
-import re
-import uuid
 
-from caliper import metric, reservoir, snapshot
+from caliper import labels, metric, registry, reservoir, snapshot
 
 from caliper.metric import (
+    CachedGauge,
     Counter,
+    DerivedGauge,
     EWMA,
     Gauge,
     Histogram,
     Meter,
+    RatioGauge,
     Timer,
 )
+from caliper.labels import LabelSet, labelset
+from caliper.registry import Registry
 from caliper.reservoir import (
     ExponentiallyDecayingReservoir,
+    LogExponentiallyDecayingReservoir,
     Reservoir,
     SlidingWindowReservoir,
     UniformReservoir,
@@ -21,33 +25,28 @@ from caliper.reservoir import (
 from caliper.snapshot import Snapshot, WeightedSnapshot
 
 __all__ = [
-    'metric', 'registry', 'reservoir', 'snapshot',
+    'labels', 'metric', 'registry', 'reservoir', 'snapshot',
     'Counter', 'Gauge', 'Histogram', 'Timer', 'Meter', 'EWMA',
+    'CachedGauge', 'DerivedGauge', 'RatioGauge',
     'Reservoir', 'SlidingWindowReservoir', 'UniformReservoir',
-    'ExponentiallyDecayingReservoir', 'Registry',
-    'Snapshot', 'WeightedSnapshot',
+    'ExponentiallyDecayingReservoir', 'LogExponentiallyDecayingReservoir', 'Registry',
+    'Snapshot', 'WeightedSnapshot', 'LabelSet', 'labelset',
     'create_metric', 'counter', 'gauge', 'histogram', 'meter', 'timer',
+    'register', 'collect_gauges', 'group_by', 'sweep', 'capture', 'default_registry',
 ]
 
 
-_registry = {}
+_registry = Registry()
 
+#: The registry used by the module level functions.
+default_registry = _registry
 
-def get_or_create_metric(cls, name=None, *args, **kwargs):
-    name = name or ('a%s' % uuid.uuid4().hex)
-    key = _split_registry_key('%s.%s' % (name, cls.__name__))
-
-    metric = _registry.get(key)
-    if metric:
-        if not type(metric) is cls:
-            raise TypeError('A metric with key %s already exists with type %s' %
-                    ('.'.join(key), metric.__class__))
-    else:
-        metric = cls(*args, **kwargs)
-        _registry[key] = metric
-
-    return metric
-
+get_or_create_metric = _registry.get_or_create_metric
+register = _registry.register
+collect_gauges = _registry.collect_gauges
+group_by = _registry.group_by
+sweep = _registry.sweep
+capture = _registry.capture
 
 counter = partial(get_or_create_metric, Counter)
 gauge = partial(get_or_create_metric, Gauge)
@@ -56,9 +55,24 @@ meter = partial(get_or_create_metric, Meter)
 timer = partial(get_or_create_metric, Timer)
 
 
-def _split_registry_key(keystr):
-    match = re.match('^([a-zA-Z][a-zA-Z0-9_]*)(?:\.([a-zA-Z][a-zA-Z0-9_]*))*$', keystr)
-    if not match:
-        raise ValueError("'%s' is in invalid registry key" % keystr)
+# Optional subsystems are imported on first use to keep ``import caliper`` fast.
+_LAZY_MODULES = ('aio', 'alerting', 'cli', 'history', 'instrument')
+_LAZY_ATTRIBUTES = {
+    'AlertEngine': 'alerting',
+    'History': 'history',
+    'Instrumenter': 'instrument',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_MODULES:
+        from importlib import import_module
+        return import_module('caliper.%s' % name)
+    if name in _LAZY_ATTRIBUTES:
+        from importlib import import_module
+        return getattr(import_module('caliper.%s' % _LAZY_ATTRIBUTES[name]), name)
+    raise AttributeError("module 'caliper' has no attribute '%s'" % name)
+
 
-    return tuple(keystr.split('.'))
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_MODULES) | set(_LAZY_ATTRIBUTES))
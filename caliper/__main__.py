@@ -0,0 +1,5 @@
+import sys
+
+from caliper.cli import main
+
+sys.exit(main())
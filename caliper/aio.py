@@ -0,0 +1,66 @@
+'''
+    Asyncio
+    ~~~~~~~
+    Helpers for applications that run an :mod:`asyncio` event loop.
+'''
+
+import asyncio
+import weakref
+
+from .registry import _split_gauges
+
+
+# The running executor evaluations of gauges per registry, by ``(key, labels)``.
+_inflight = weakref.WeakKeyDictionary()
+
+
+async def collect_gauges(registry, timeout=None, default=None):
+    ''' The :mod:`asyncio` counterpart of
+    :meth:`~caliper.registry.Registry.collect_gauges`.
+
+    Gauges whose :meth:`~caliper.metric.Gauge.get_value` is a coroutine function
+    are awaited on the running loop, other callback gauges run in the loop's
+    default executor. All of them are gathered concurrently and each is given
+    its own timeout.
+
+    A coroutine gauge that times out is cancelled. An executor gauge that times
+    out keeps running, like with the threaded collector it isn't evaluated again
+    until that call has returned, so a stuck callback occupies at most one thread
+    of the executor.
+
+    :param registry: The :class:`~caliper.registry.Registry` to collect from.
+    :param timeout: Seconds to wait for gauges that don't set their own timeout,
+                    defaults to :attr:`~caliper.registry.Registry.DEFAULT_GAUGE_TIMEOUT`.
+    :param default: Value reported for gauges that time out or raise.
+    '''
+    timeout = timeout or registry.DEFAULT_GAUGE_TIMEOUT
+    loop = asyncio.get_running_loop()
+    inflight = _inflight.setdefault(registry, {})
+
+    values, callbacks = _split_gauges(registry.gauges())
+    results = await asyncio.gather(*(
+        _evaluate(inflight, loop, key, gauge, gauge.timeout or timeout, default)
+        for key, gauge in callbacks))
+    values.update(zip((key for key, _ in callbacks), results))
+    for key in [key for key, future in inflight.items() if future.done()]:
+        del inflight[key]
+    return values
+
+
+async def _evaluate(inflight, loop, key, gauge, timeout, default):
+    if asyncio.iscoroutinefunction(gauge.get_value):
+        pending = gauge.get_value()
+    else:
+        # Shielded, so that a timeout doesn't forget a call that keeps running.
+        pending = asyncio.shield(_submit(inflight, loop, key, gauge))
+    try:
+        return await asyncio.wait_for(pending, timeout)
+    except Exception:
+        return default
+
+
+def _submit(inflight, loop, key, gauge):
+    future = inflight.get(key)
+    if future is None or future.done() or future.get_loop() is not loop:
+        future = inflight[key] = loop.run_in_executor(None, getattr, gauge, 'value')
+    return future
@@ -0,0 +1,345 @@
+'''
+    Alerting
+    ~~~~~~~~
+    Evaluates alerting rules against the metrics of a registry in process, so that
+    conditions such as "p99 of ``db.query`` above 200ms for 3 intervals" don't require
+    shipping every snapshot to an external system.
+
+    >>> from caliper.metric import Timer
+    >>> engine = AlertEngine(callback=print)
+    >>> rule = engine.add(ThresholdRule('slow queries', Timer, 'db.query', 'p99', '>',
+    ...                                 0.2, for_intervals=3))
+
+    Call :meth:`AlertEngine.evaluate` from the reporting loop.
+'''
+
+import operator
+
+from collections import deque, namedtuple
+from timeit import default_timer
+
+
+#: An alert changed state. `labels` is the :class:`~caliper.labels.LabelSet` of the
+#: metric, `value` the value the rule was evaluated with (``None`` for an alert that
+#: was resolved because its metric went away) and `timestamp` the
+#: :func:`timeit.default_timer` time of the evaluation.
+Event = namedtuple('Event', 'rule labels state value timestamp')
+
+FIRING = 'firing'
+RESOLVED = 'resolved'
+
+_OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+
+class Rule(object):
+    ''' Base class for rules, which are evaluated for every label set of the metric
+    of type `cls` registered under `metric`.
+
+    :param name: The name of the rule.
+    :param labels: Only evaluate the rule for label sets that contain these labels,
+                   for all label sets if omitted.
+    :param for_intervals: The number of consecutive evaluations the condition has
+                          to hold before the alert fires.
+    '''
+
+    def __init__(self, name, cls, metric, labels=None, for_intervals=1):
+        self.name = name
+        self.cls = cls
+        self.metric = metric
+        self.labels = dict((k, str(v)) for k, v in (labels or {}).items())
+        self.for_intervals = for_intervals
+
+    def matches(self, label_set):
+        ''' Whether the rule applies to the metric labelled with `label_set`. '''
+        return all(label_set.get(k) == v for k, v in self.labels.items())
+
+    def check(self, cycle, label_set, metric):
+        ''' Returns a tuple of whether the condition holds for `metric` and the value
+        it was checked with. '''
+        raise NotImplementedError()
+
+    def forget(self, label_set):
+        ''' Drop any state kept for `label_set`, whose metric went away. '''
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.name)
+
+
+class ThresholdRule(Rule):
+    ''' Fires when a statistic of a metric compares to `threshold` with `op`.
+
+    :param stat: The statistic to compare, either a quantile such as ``'p05'``,
+                 ``'p99'``, ``'p999'`` or ``'p100'``, the name of an attribute of
+                 the metric such as ``'mean'``, ``'count'`` or ``'value'``, or a
+                 callable that is passed the metric.
+    :param op: One of ``'>'``, ``'>='``, ``'<'`` and ``'<='``.
+    '''
+
+    def __init__(self, name, cls, metric, stat, op, threshold, labels=None,
+                 for_intervals=1):
+        super(ThresholdRule, self).__init__(name, cls, metric, labels, for_intervals)
+        self.stat = _statistic(stat)
+        self.op = _operator(op)
+        self.threshold = threshold
+
+    def check(self, cycle, label_set, metric):
+        value = cycle.value(metric, self.stat)
+        return self.op(value, self.threshold), value
+
+
+class RateOfChangeRule(Rule):
+    ''' Fires when the change per second of a statistic of a metric between two
+    evaluations compares to `threshold` with `op`, see :class:`ThresholdRule`.
+
+    The first evaluation of a metric only records the statistic.
+    '''
+
+    def __init__(self, name, cls, metric, stat, op, threshold, labels=None,
+                 for_intervals=1):
+        super(RateOfChangeRule, self).__init__(name, cls, metric, labels, for_intervals)
+        self.stat = _statistic(stat)
+        self.op = _operator(op)
+        self.threshold = threshold
+        self._previous = {}
+
+    def check(self, cycle, label_set, metric):
+        value = cycle.value(metric, self.stat)
+        previous = self._previous.get(label_set)
+        self._previous[label_set] = (value, cycle.now)
+        if previous is None or cycle.now <= previous[1]:
+            return False, None
+        rate = (value - previous[0]) / (cycle.now - previous[1])
+        return self.op(rate, self.threshold), rate
+
+    def forget(self, label_set):
+        self._previous.pop(label_set, None)
+
+
+class BurnRateRule(Rule):
+    ''' Fires when an error budget is being used up too fast, as in the multiwindow
+    burn rate alerts of the Google SRE workbook.
+
+    The burn rate is the ratio of the increase of the `errors` count to that of the
+    `total` count over a window, divided by the error budget ``1 - objective``.
+    The rule fires when the burn rate over both `long_window` and `short_window`
+    is at least `factor`, the default fires when 2% of a 30 day budget is spent
+    within an hour. The value of an event is the burn rate over `long_window`.
+
+    :param cls: The type of both metrics, for instance
+                :class:`~caliper.metric.Counter` or :class:`~caliper.metric.Meter`.
+    :param errors: The name of the metric that counts errors, it is looked up with
+                   the label set of the `total` metric.
+    :param total: The name of the metric that counts all events.
+    :param objective: The fraction of events that should succeed.
+    :param long_window: Seconds.
+    :param short_window: Seconds.
+    '''
+
+    def __init__(self, name, cls, errors, total, objective=0.999, factor=14.4,
+                 long_window=3600, short_window=300, labels=None, for_intervals=1):
+        super(BurnRateRule, self).__init__(name, cls, total, labels, for_intervals)
+        assert 0 < objective < 1
+        assert short_window <= long_window
+        self.errors = errors
+        self.budget = 1.0 - objective
+        self.factor = factor
+        self.long_window = long_window
+        self.short_window = short_window
+        self._history = {}
+
+    def check(self, cycle, label_set, metric):
+        error_metric = cycle.family(self.cls, self.errors).get(label_set)
+        errors = error_metric.count if error_metric is not None else 0
+
+        history = self._history.get(label_set)
+        if history is None:
+            history = self._history[label_set] = deque()
+        history.append((cycle.now, errors, metric.count))
+
+        # Keep the latest sample that is at least `long_window` old as the start of
+        # the long window.
+        horizon = cycle.now - self.long_window
+        while len(history) > 1 and history[1][0] <= horizon:
+            history.popleft()
+
+        long_rate = self._burn_rate(history, history[0])
+        short_rate = self._burn_rate(history, self._start(history, self.short_window))
+        return min(long_rate, short_rate) >= self.factor, long_rate
+
+    def forget(self, label_set):
+        self._history.pop(label_set, None)
+
+    def _start(self, history, window):
+        horizon = history[-1][0] - window
+        for sample in reversed(history):
+            if sample[0] <= horizon:
+                return sample
+        return history[0]
+
+    def _burn_rate(self, history, start):
+        _, errors, total = history[-1]
+        if total <= start[2]:
+            return 0.0
+        return (errors - start[1]) / float(total - start[2]) / self.budget
+
+
+class AlertEngine(object):
+    ''' Evaluates rules against the metrics of a registry and emits an
+    :class:`Event` whenever an alert starts or stops firing.
+
+    Rules are indexed by the metric they apply to, so an evaluation only looks at
+    the metrics that have rules. Each metric is snapshotted at most once per
+    evaluation, however many rules need its quantiles.
+
+    :param registry: The :class:`~caliper.registry.Registry` to evaluate rules
+                     against, defaults to the registry of the ``caliper`` module.
+    :param callback: Called with every :class:`Event`.
+    '''
+
+    def __init__(self, registry=None, callback=None):
+        if registry is None:
+            from caliper import default_registry as registry
+        self.registry = registry
+        self.callback = callback
+        self._rules = {}
+        self._states = {}
+
+    def add(self, rule):
+        ''' Add `rule` to the engine.
+
+        :returns: `rule`.
+        '''
+        self._rules.setdefault((rule.cls, rule.metric), []).append(rule)
+        return rule
+
+    def remove(self, rule):
+        ''' Remove `rule` from the engine, its alerts are dropped without events. '''
+        index = (rule.cls, rule.metric)
+        rules = self._rules[index]
+        rules.remove(rule)
+        if not rules:
+            del self._rules[index]
+        for ident in [ident for ident in self._states if ident[0] is rule]:
+            del self._states[ident]
+            rule.forget(ident[1])
+
+    def rules(self):
+        ''' Returns a list of all rules. '''
+        return [rule for rules in self._rules.values() for rule in rules]
+
+    def firing(self):
+        ''' Returns a list of ``(rule, labels)`` tuples of the alerts that are
+        currently firing. '''
+        return [ident for ident, (_, firing) in self._states.items() if firing]
+
+    def evaluate(self, now=None):
+        ''' Evaluate all rules.
+
+        :param now: The current :func:`timeit.default_timer` time.
+        :returns: A list of the emitted :class:`Event` tuples.
+        '''
+        cycle = _Cycle(self.registry, default_timer() if now is None else now)
+        events = []
+        seen = set()
+        for (cls, name), rules in self._rules.items():
+            family = cycle.family(cls, name)
+            for rule in rules:
+                self._evaluate_rule(cycle, rule, family, seen, events)
+        self._resolve_missing(cycle, seen, events)
+
+        if self.callback is not None:
+            for event in events:
+                self.callback(event)
+        return events
+
+    def _evaluate_rule(self, cycle, rule, family, seen, events):
+        for label_set, metric in family.items():
+            if rule.labels and not rule.matches(label_set):
+                continue
+            ident = (rule, label_set)
+            seen.add(ident)
+            condition, value = rule.check(cycle, label_set, metric)
+            state = self._transition(ident, condition)
+            if state is not None:
+                events.append(Event(rule, label_set, state, value, cycle.now))
+
+    def _resolve_missing(self, cycle, seen, events):
+        ''' Drop the alerts of metrics that went away, resolving those that fired. '''
+        for ident in [ident for ident in self._states if ident not in seen]:
+            rule, label_set = ident
+            _, firing = self._states.pop(ident)
+            rule.forget(label_set)
+            if firing:
+                events.append(Event(rule, label_set, RESOLVED, None, cycle.now))
+
+    def _transition(self, ident, condition):
+        ''' Update the state of an alert, returns the new state if it changed. '''
+        streak, firing = self._states.get(ident, (0, False))
+        if condition:
+            streak += 1
+            if not firing and streak >= ident[0].for_intervals:
+                self._states[ident] = (streak, True)
+                return FIRING
+            self._states[ident] = (streak, firing)
+        else:
+            self._states[ident] = (0, False)
+            if firing:
+                return RESOLVED
+        return None
+
+
+class _Cycle(object):
+    ''' The metrics and snapshots used by a single evaluation. '''
+
+    def __init__(self, registry, now):
+        self.now = now
+        self._registry = registry
+        self._families = {}
+        self._snapshots = {}
+
+    def family(self, cls, name):
+        family = self._families.get((cls, name))
+        if family is None:
+            family = self._families[(cls, name)] = self._registry.family(cls, name)
+        return family
+
+    def value(self, metric, stat):
+        if isinstance(stat, float):
+            snapshot = self._snapshots.get(id(metric))
+            if snapshot is None:
+                snapshot = self._snapshots[id(metric)] = metric.snapshot()
+            return snapshot.get_value(stat)
+        if callable(stat):
+            return stat(metric)
+        return getattr(metric, stat)
+
+
+_EXTREME_QUANTILES = {'p0': 0.0, 'p100': 1.0}
+
+
+def _statistic(stat):
+    ''' Returns the quantile of a stat named like :func:`~caliper.util.column_name`
+    as a float, such as 0.99 for ``'p99'`` and 1 for ``'p100'``, other stats as is.
+    Forms like ``'p5'`` or ``'p990'`` are ambiguous and rejected. '''
+    if not (isinstance(stat, str) and stat[:1] == 'p' and stat[1:].isdigit()):
+        return stat
+    if stat in _EXTREME_QUANTILES:
+        return _EXTREME_QUANTILES[stat]
+    digits = stat[1:]
+    if len(digits) < 2 or len(digits) > 2 and digits[-1] == '0':
+        raise ValueError("Ambiguous quantile %r, use for instance 'p50' for the median, "
+                         "'p05' for the 5th percentile or 'p100' for the maximum" % stat)
+    return float('0.' + digits)
+
+
+def _operator(op):
+    try:
+        return _OPERATORS[op]
+    except KeyError:
+        raise ValueError('Unknown operator %r, expected one of %s' %
+                         (op, ', '.join(sorted(_OPERATORS))))
@@ -0,0 +1,338 @@
+'''
+    Command line
+    ~~~~~~~~~~~~
+    Computes percentiles of a column of large files per key, for instance the
+    latency per endpoint of an access log::
+
+        python -m caliper access.log --key 7 --value 11 --scale 0.001
+
+    Files are split into shards at line boundaries. The shards are read through
+    :mod:`mmap` in chunks of whole lines and parsed by a pool of processes into a
+    histogram per key, and the histograms of all shards are merged, so the analysis
+    scales with the number of cores.
+'''
+
+import argparse
+import json
+import mmap
+import os
+import sys
+
+from collections import namedtuple
+from random import Random
+
+from .metric import Histogram
+from .reservoir import UniformReservoir
+from .util import column_name
+
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+DEFAULT_RESERVOIR_SIZE = 10000
+DEFAULT_SHARD_SIZE = 64 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+#: The key of all lines when no key column is given.
+ALL = '*'
+
+#: How lines are parsed, see :func:`parse_args`. Columns are indices into the
+#: fields of a line, `key` is ``None`` to put all lines under :data:`ALL`.
+Options = namedtuple('Options', 'key value delimiter scale reservoir_size seed')
+
+
+def shards(paths, shard_size=DEFAULT_SHARD_SIZE):
+    ''' Split `paths` into ``(path, start, end)`` byte ranges of about `shard_size`
+    bytes. A shard covers the lines that start within its range. '''
+    result = []
+    for path in paths:
+        size = os.path.getsize(path)
+        for start in range(0, size, shard_size):
+            result.append((path, start, min(start + shard_size, size)))
+    return result
+
+
+def read_shard(path, start, end, chunk_size=DEFAULT_CHUNK_SIZE):
+    ''' Yields the bytes of the lines of `path` that start within ``[start, end)``
+    in chunks of whole lines of about `chunk_size` bytes, read through a memory map,
+    so memory use is bounded by the chunk size and not by the shard size. '''
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            size = len(mapped)
+            begin = 0 if start == 0 else _line_start(mapped, start, size)
+            finish = size if end >= size else _line_start(mapped, end, size)
+            while begin < finish:
+                stop = begin + chunk_size
+                stop = finish if stop >= finish else _line_start(mapped, stop, finish)
+                yield mapped[begin:stop]
+                begin = stop
+        finally:
+            mapped.close()
+
+
+def _line_start(mapped, position, size):
+    ''' The offset of the first line that starts at or after `position`. '''
+    newline = mapped.find(b'\n', position - 1)
+    return size if newline == -1 else newline + 1
+
+
+def analyze_shard(index, shard, options):
+    ''' Parse a shard into a histogram per key.
+
+    :param index: The number of the shard, seeds its random number generator.
+    :returns: A tuple of a mapping of key to :class:`~caliper.metric.Histogram` and
+              the number of lines that couldn't be parsed.
+    '''
+    if options.seed is None:
+        rng = Random()
+    else:
+        rng = Random('%s:%d' % (options.seed, index))
+    histograms = {}
+    skipped = 0
+    for chunk in read_shard(*shard):
+        skipped += parse(chunk, options, histograms, rng)
+    decoded = dict((_decode(key), histogram) for key, histogram in histograms.items())
+    return decoded, skipped
+
+
+def parse(data, options, histograms, rng):
+    ''' Add the lines of `data` to `histograms`, a mapping of key to histogram.
+
+    :returns: The number of lines that couldn't be parsed, empty lines aren't
+              counted.
+    '''
+    key_column, value_column = options.key, options.value
+    delimiter, scale, size = options.delimiter, options.scale, options.reservoir_size
+    get = histograms.get
+    skipped = 0
+    for line in data.splitlines():
+        fields = line.split(delimiter)
+        try:
+            value = float(fields[value_column]) * scale
+            key = ALL if key_column is None else fields[key_column]
+        except (IndexError, ValueError):
+            skipped += bool(line.strip())
+            continue
+        histogram = get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(UniformReservoir(size, rng))
+        histogram.update(value)
+    return skipped
+
+
+def analyze(paths, options, jobs=None, shard_size=DEFAULT_SHARD_SIZE):
+    ''' Parse `paths` into a merged histogram per key using `jobs` processes, all
+    cores by default.
+
+    :returns: A tuple of a mapping of key to histogram and the number of lines that
+              couldn't be parsed.
+    '''
+    work = shards(paths, shard_size)
+    jobs = jobs or os.cpu_count() or 1
+    args = (range(len(work)), work, [options] * len(work))
+
+    if jobs == 1 or len(work) <= 1:
+        results = map(analyze_shard, *args)
+        return _merge(results)
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(jobs, len(work))) as executor:
+        return _merge(executor.map(analyze_shard, *args))
+
+
+def _merge(results):
+    merged = {}
+    skipped = 0
+    for histograms, shard_skipped in results:
+        skipped += shard_skipped
+        for key, histogram in histograms.items():
+            if key in merged:
+                merged[key].merge(histogram)
+            else:
+                merged[key] = histogram
+    return merged, skipped
+
+
+def summarize(histograms, quantiles=DEFAULT_QUANTILES):
+    ''' Returns a mapping of key to a mapping of statistic to value, the quantiles
+    are named like ``p99`` for 0.99. '''
+    results = {}
+    for key, histogram in histograms.items():
+        summary = histogram.summary(quantiles)
+        stats = {
+            'count': histogram.count,
+            'mean': histogram.mean,
+            'stddev': histogram.stddev,
+            'min': histogram.min,
+            'max': histogram.max,
+        }
+        for quantile in quantiles:
+            stats[column_name(quantile)] = summary.get_value(quantile)
+        results[key] = stats
+    return results
+
+
+def compare(results, baseline, columns, threshold):
+    ''' Compare the `columns` of `results` with `baseline`, both as returned by
+    :func:`summarize`.
+
+    :param threshold: Maximum allowed relative increase, ``0.1`` allows values to be
+                      10% higher than the baseline.
+    :returns: A list of ``(key, column, baseline, result, ratio, regressed)`` tuples
+              for every key present in both.
+    '''
+    rows = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        for column in columns:
+            old = baseline[key].get(column)
+            if old is None:
+                continue
+            new = results[key][column]
+            ratio = new / old if old else float('inf') if new else 1.0
+            rows.append((key, column, old, new, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def format_table(results, columns, sort='key'):
+    ''' Returns the lines of a table of `results` with a row per key. '''
+    if sort == 'key':
+        keys = sorted(results)
+    else:
+        keys = sorted(results, key=lambda k: (-results[k][sort], k))
+    width = max([len('key')] + [len(key) for key in keys])
+    lines = ['%-*s %12s' % (width, 'key', 'count') +
+             ''.join(' %12s' % column for column in columns)]
+    for key in keys:
+        stats = results[key]
+        lines.append('%-*s %12d' % (width, key, stats['count']) +
+                     ''.join(' %12.6g' % stats[column] for column in columns))
+    return lines
+
+
+def _decode(key):
+    if isinstance(key, bytes):
+        return key.decode('utf-8', 'replace')
+    return key
+
+
+def _column(value):
+    ''' Converts a 1-based column number, negative from the end, to an index. '''
+    number = int(value)
+    if number == 0:
+        raise argparse.ArgumentTypeError('columns are numbered from 1')
+    return number - 1 if number > 0 else number
+
+
+def _quantiles(value):
+    try:
+        quantiles = tuple(float(q) for q in value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected comma separated quantiles')
+    if not all(0 <= q <= 1 for q in quantiles):
+        raise argparse.ArgumentTypeError('quantiles must be between 0 and 1')
+    return quantiles
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='caliper', description='Compute percentiles of a column of large files '
+                                    'per key.')
+    parser.add_argument('files', nargs='+', metavar='FILE')
+    parser.add_argument('-v', '--value', type=_column, required=True, metavar='COLUMN',
+                        help='The column with the values, numbered from 1 and from '
+                             'the end if negative.')
+    parser.add_argument('-k', '--key', type=_column, metavar='COLUMN',
+                        help='The column with the keys to group values by.')
+    parser.add_argument('-d', '--delimiter',
+                        help='The field delimiter (default: whitespace).')
+    parser.add_argument('-s', '--scale', type=float, default=1.0,
+                        help='Multiply values by SCALE, for instance 0.001 for '
+                             'milliseconds to seconds.')
+    parser.add_argument('-q', '--quantiles', type=_quantiles, default=DEFAULT_QUANTILES,
+                        help='Comma separated quantiles (default: %s).' %
+                             ','.join(str(q) for q in DEFAULT_QUANTILES))
+    parser.add_argument('--sort', default='key',
+                        help="Sort by 'key' or a column, in descending order.")
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='Number of processes (default: the number of cores).')
+    parser.add_argument('--reservoir-size', type=int, default=DEFAULT_RESERVOIR_SIZE,
+                        help='Number of values sampled per key and shard (default: '
+                             '%d).' % DEFAULT_RESERVOIR_SIZE)
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE,
+                        help='Bytes per shard (default: %d).' % DEFAULT_SHARD_SIZE)
+    parser.add_argument('--seed', help='Seed the sampling, for reproducible results.')
+    parser.add_argument('--json', metavar='PATH',
+                        help="Write the results as JSON to PATH ('-' for stdout).")
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='Compare the quantiles with a JSON file written by '
+                             '--json.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative increase that counts as a regression '
+                             '(default: 0.1).')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    delimiter = args.delimiter.encode() if args.delimiter else None
+    options = Options(args.key, args.value, delimiter, args.scale, args.reservoir_size,
+                      args.seed)
+    columns = ['mean', 'min'] + [column_name(q) for q in args.quantiles] + ['max']
+    if args.sort not in ['key', 'count'] + columns:
+        sys.stderr.write('caliper: can not sort by %r\n' % args.sort)
+        return 2
+
+    histograms, skipped = analyze(args.files, options, args.jobs, args.shard_size)
+    results = summarize(histograms, args.quantiles)
+    out = sys.stderr if args.json == '-' else sys.stdout
+
+    write_table(results, columns, args.sort, skipped, out)
+    if args.json:
+        write_json(results, args.quantiles, skipped, args.json)
+    if args.compare and report_regressions(results, args.quantiles, args.compare,
+                                           args.threshold, out):
+        return 1
+    return 0
+
+
+def write_table(results, columns, sort, skipped, out):
+    for line in format_table(results, columns, sort):
+        out.write(line + '\n')
+    if skipped:
+        out.write('\n%d line(s) could not be parsed\n' % skipped)
+
+
+def write_json(results, quantiles, skipped, path):
+    ''' Writes `results` to `path` as JSON, to stdout if `path` is ``'-'``. '''
+    document = {'quantiles': list(quantiles), 'skipped': skipped, 'results': results}
+    if path == '-':
+        json.dump(document, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(path, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+
+
+def report_regressions(results, quantiles, path, threshold, out):
+    ''' Writes the comparison of the `quantiles` of `results` with the baseline
+    written by ``--json`` at `path` to `out`.
+
+    :returns: The number of regressions.
+    '''
+    with open(path) as f:
+        baseline = json.load(f)['results']
+
+    regressions = 0
+    columns = [column_name(q) for q in quantiles]
+    out.write('\n%-30s %6s %12s %12s %8s\n' % ('key', '', 'baseline', 'current',
+                                               'ratio'))
+    for key, column, old, new, ratio, regressed in compare(results, baseline, columns,
+                                                           threshold):
+        regressions += regressed
+        out.write('%-30s %6s %12.6g %12.6g %7.2fx%s\n' % (
+            key, column, old, new, ratio, '  REGRESSION' if regressed else ''))
+
+    if regressions:
+        out.write('\n%d regression(s) above %.0f%%\n' % (regressions, threshold * 100))
+    return regressions
@@ -0,0 +1,344 @@
+'''
+    History
+    ~~~~~~~
+    Keeps a local history of the metrics of a registry, so past values can be
+    queried without an external time series database.
+
+    >>> import time
+    >>> from caliper.metric import Timer
+    >>> from caliper.registry import Registry
+    >>> registry = Registry()
+    >>> registry.get_or_create_metric(Timer, 'db.query').update(0.1)
+    >>> history = History(registry)
+    >>> history.record()
+    >>> times, p99 = history.query(Timer, 'db.query', 'p99', time.time() - 1800)
+
+    Call :meth:`History.record` from the reporting loop, at least as often as the
+    finest resolution.
+'''
+
+import time
+
+from array import array
+
+from .labels import labelset
+from .metric import Counter, Gauge, Meter
+from .registry import _split_registry_key
+from .util import column_name
+
+
+# How the values of a column are consolidated into a bucket.
+_LAST, _MIN, _MAX, _MEAN = range(4)
+
+
+class History(object):
+    ''' Records a row of statistics per metric of a registry on every call of
+    :meth:`record`, in fixed size columnar ring buffers.
+
+    Each resolution consolidates the rows it receives into buckets of its step,
+    completed buckets are passed on to the next (coarser) resolution. Quantiles and
+    means are averaged, ignoring NaN, minimums, maximums and counts are carried as
+    the minimum, the maximum and the last value. The buckets of the finest resolution are
+    consolidated from the recorded rows.
+
+    :param registry: The :class:`~caliper.registry.Registry` to record, defaults to
+                     the registry of the ``caliper`` module.
+    :param resolutions: A sequence of ``(step, size)`` tuples from fine to coarse,
+                        the step is in seconds and `size` is the number of buckets
+                        kept. The default keeps an hour of 10 second buckets, a day
+                        of minutes and a week of hours.
+    :param quantiles: The quantiles recorded for histograms and timers.
+
+    Histograms and timers record their ``count``, the exact ``mean`` of the values
+    since the previous call of :meth:`record` (NaN if there are none), and the
+    ``min``, ``max`` and a column per quantile of their
+    :meth:`~caliper.metric.Histogram.summary`, named like ``p99`` for 0.99 and
+    ``p999`` for 0.999. These describe the recent values the reservoir holds
+    rather than all values since the metric was created. Counters and meters
+    record ``count``, gauges ``value``. A metric takes
+    ``8 * (columns + 1) * sum(sizes)`` bytes, which is about 140KB for a timer with
+    the defaults. Metrics that left the registry are dropped from the history.
+    '''
+
+    DEFAULT_RESOLUTIONS = ((10, 360), (60, 1440), (3600, 168))
+    DEFAULT_QUANTILES = (0.5, 0.95, 0.99, 0.999)
+
+    def __init__(self, registry=None, resolutions=DEFAULT_RESOLUTIONS,
+                 quantiles=DEFAULT_QUANTILES):
+        if registry is None:
+            from caliper import default_registry as registry
+        self.registry = registry
+        self.resolutions = tuple(resolutions)
+        self.quantiles = tuple(quantiles)
+        self._sampling_columns = ('count', 'mean', 'min', 'max') + tuple(
+            column_name(q) for q in self.quantiles)
+        self._series = {}
+        # The number and sum of the values of each sampling metric at the last
+        # record, for the mean of the values since.
+        self._totals = {}
+
+    def record(self, now=None, gauge_values=None):
+        ''' Record the current statistics of all metrics.
+
+        :param now: The current :func:`time.time`.
+        :param gauge_values: The values of gauges as returned by
+                             :meth:`~caliper.registry.Registry.collect_gauges`,
+                             gauges are read directly if it is omitted.
+        '''
+        now = time.time() if now is None else now
+        series = self._series
+        present = set()
+        for key, label_set, metric in self.registry.items():
+            ident = (key, label_set)
+            present.add(ident)
+            row = self._row(metric, ident, gauge_values)
+            if row is None:
+                continue
+
+            history = series.get(ident)
+            if history is None:
+                history = series[ident] = self._create_series(metric)
+            history.add(now, row)
+
+        for ident in [ident for ident in series if ident not in present]:
+            del series[ident]
+            self._totals.pop(ident, None)
+
+    def columns(self, cls, name, /, **labels):
+        ''' Returns the names of the columns recorded for a metric. '''
+        return self._get(cls, name, labels).columns
+
+    def query(self, cls, name, column, start, /, end=None, resolution=None, **labels):
+        ''' Returns the history of a column of the metric of type `cls` registered
+        under `name` and `labels` from the bucket `start` falls in up to `end`, as a
+        tuple of ``array('d')`` of bucket start times and of values.
+
+        :param resolution: The step of the resolution to query, defaults to the
+                           finest resolution that goes back to `start`.
+
+        The other keyword arguments are labels. Labels named ``end`` or
+        ``resolution`` can't be queried.
+
+        Only completed buckets are returned. A query copies at most two slices per
+        array and doesn't allocate per point.
+        '''
+        series = self._get(cls, name, labels)
+        try:
+            index = series.columns.index(column)
+        except ValueError:
+            raise ValueError('No column %r, expected one of %s' %
+                             (column, ', '.join(series.columns)))
+        ring = series.ring(start, resolution)
+        return ring.range(index, start, end)
+
+    def _get(self, cls, name, labels):
+        key = _split_registry_key('%s.%s' % (name, cls.__name__))
+        try:
+            return self._series[(key, labelset(labels))]
+        except KeyError:
+            raise KeyError('No history for %s %r' % ('.'.join(key), labels))
+
+    def _create_series(self, metric):
+        if isinstance(metric, Gauge):
+            columns, consolidation = ('value',), (_MEAN,)
+        elif hasattr(metric, 'summary'):
+            columns = self._sampling_columns
+            consolidation = (_LAST, _MEAN, _MIN, _MAX) + (_MEAN,) * len(self.quantiles)
+        else:
+            columns, consolidation = ('count',), (_LAST,)
+        return _Series(columns, consolidation, self.resolutions)
+
+    def _row(self, metric, ident, gauge_values):
+        ''' The row to record for `metric`, ``None`` if it has no history. '''
+        if isinstance(metric, Gauge):
+            return (_gauge_value(metric, ident, gauge_values),)
+        if hasattr(metric, 'summary'):
+            return self._sampling_row(metric, ident)
+        if isinstance(metric, (Counter, Meter)):
+            return (metric.count,)
+        return None
+
+    def _sampling_row(self, metric, ident):
+        summary = metric.summary(self.quantiles)
+        n, total = metric._n, metric._sum
+        previous_n, previous_total = self._totals.get(ident, (0, 0))
+        if n < previous_n:
+            # The metric was replaced by a new one.
+            previous_n, previous_total = 0, 0
+        self._totals[ident] = (n, total)
+        mean = float('nan')
+        if n > previous_n:
+            mean = (total - previous_total) / float(n - previous_n)
+        row = [metric.count, mean, summary.min, summary.max]
+        row.extend(summary.get_value(q) for q in self.quantiles)
+        return row
+
+
+class _Series(object):
+    ''' The rings of all resolutions of a single metric. '''
+
+    __slots__ = ('columns', '_rings')
+
+    def __init__(self, columns, consolidation, resolutions):
+        self.columns = columns
+        self._rings = [_Ring(step, size, consolidation) for step, size in resolutions]
+
+    def add(self, now, row):
+        for ring in self._rings:
+            completed = ring.add(now, row)
+            if completed is None:
+                break
+            now, row = completed
+
+    def ring(self, start, resolution=None):
+        if resolution is not None:
+            return self._ring_with_step(resolution)
+
+        for ring in self._rings:
+            if ring.oldest() <= start:
+                return ring
+        # None goes back far enough, use the one that goes back furthest.
+        return min(self._rings, key=lambda ring: ring.oldest())
+
+    def _ring_with_step(self, step):
+        for ring in self._rings:
+            if ring.step == step:
+                return ring
+        raise ValueError('No resolution with a step of %s seconds' % step)
+
+
+class _Ring(object):
+    ''' A fixed size ring buffer of buckets of `step` seconds, with an
+    ``array('d')`` of bucket start times and one per column. '''
+
+    __slots__ = ('step', 'size', '_consolidation', '_lasts', '_mins', '_maxes',
+                 '_means', '_times', '_columns', '_next', '_len', '_bucket',
+                 '_pending', '_pending_rows', '_pending_counts')
+
+    def __init__(self, step, size, consolidation):
+        assert step > 0 and size > 0
+        self.step = step
+        self.size = size
+        self._consolidation = consolidation
+        # The indices of the columns consolidated each way.
+        self._lasts, self._mins, self._maxes, self._means = [
+            tuple(i for i, c in enumerate(consolidation) if c == how)
+            for how in (_LAST, _MIN, _MAX, _MEAN)]
+        self._times = array('d', [0.0]) * size
+        self._columns = [array('d', [0.0]) * size for _ in consolidation]
+        self._next = 0
+        self._len = 0
+        self._bucket = None
+        self._pending = array('d', [0.0]) * len(consolidation)
+        self._pending_rows = 0
+        # The number of values that aren't NaN in each mean column.
+        self._pending_counts = array('d', [0.0]) * len(consolidation)
+
+    def add(self, now, row):
+        ''' Consolidate `row` into the bucket of `now`.
+
+        :returns: A tuple of the start time and the row of the previous bucket if
+                  `now` completed it, otherwise ``None``.
+        '''
+        bucket = int(now // self.step)
+        completed = None
+        if bucket != self._bucket:
+            if self._pending_rows:
+                completed = self._flush()
+            self._bucket = bucket
+            self._pending_rows = 0
+
+        if self._pending_rows:
+            self._consolidate(row)
+        else:
+            self._start(row)
+        self._add_means(row)
+        self._pending_rows += 1
+        return completed
+
+    def _start(self, row):
+        pending, counts = self._pending, self._pending_counts
+        pending[:] = array('d', row)
+        for i in self._means:
+            pending[i] = counts[i] = 0.0
+
+    def _consolidate(self, row):
+        pending = self._pending
+        for i in self._lasts:
+            pending[i] = row[i]
+        # min and max keep the pending value if either is NaN.
+        for i in self._mins:
+            pending[i] = min(pending[i], row[i])
+        for i in self._maxes:
+            pending[i] = max(pending[i], row[i])
+
+    def _add_means(self, row):
+        pending, counts = self._pending, self._pending_counts
+        for i in self._means:
+            value = row[i]
+            if value == value:
+                pending[i] += value
+                counts[i] += 1
+
+    def _flush(self):
+        index = self._next
+        start = float(self._bucket * self.step)
+        self._times[index] = start
+        row = []
+        for i, how in enumerate(self._consolidation):
+            value = self._pending[i]
+            if how == _MEAN:
+                count = self._pending_counts[i]
+                value = value / count if count else float('nan')
+            self._columns[i][index] = value
+            row.append(value)
+        self._next = (index + 1) % self.size
+        self._len = min(self._len + 1, self.size)
+        return start, row
+
+    def oldest(self):
+        ''' The start time of the oldest bucket, infinity if there are none. '''
+        if not self._len:
+            return float('inf')
+        return self._times[self._head()]
+
+    def range(self, column, start, end=None):
+        # Include the bucket that `start` falls in.
+        lo = self._bisect(start - self.step, True)
+        hi = self._len if end is None else self._bisect(end, True)
+        return (self._slice(self._times, lo, hi),
+                self._slice(self._columns[column], lo, hi))
+
+    def _head(self):
+        return self._next if self._len == self.size else 0
+
+    def _bisect(self, t, right):
+        ''' The logical index of the first bucket that starts after `t`, or at `t`
+        unless `right` is true. '''
+        times, head, size = self._times, self._head(), self.size
+        lo, hi = 0, self._len
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = times[(head + mid) % size]
+            if value < t or right and value == t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _slice(self, values, lo, hi):
+        if hi <= lo:
+            return array('d')
+        first = (self._head() + lo) % self.size
+        last = first + hi - lo
+        if last <= self.size:
+            return values[first:last]
+        return values[first:] + values[:last - self.size]
+
+
+def _gauge_value(gauge, ident, gauge_values):
+    value = gauge.value if gauge_values is None else gauge_values.get(ident)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
@@ -0,0 +1,233 @@
+'''
+    Instrumentation
+    ~~~~~~~~~~~~~~~
+    Records the duration of calls to the functions of selected modules without
+    changing their code. Every function gets a :class:`~caliper.metric.Timer`
+    named after its module and qualified name, ``caliper.timer('pkg.mod.Cls.method')``.
+
+    On Python 3.12 and later the instrumentation uses :mod:`sys.monitoring`, which
+    stops reporting calls of functions that aren't selected after their first call,
+    so they run at full speed. Older versions use :func:`sys.setprofile`, which
+    costs something on every call of every function while it is active.
+'''
+
+import sys
+import threading
+
+from fnmatch import fnmatchcase
+from timeit import default_timer
+
+from .metric import Timer
+
+
+_NOT_SEEN = object()
+
+_SKIPPED_FLAGS = 0x20 | 0x80 | 0x200  # CO_GENERATOR, CO_COROUTINE, CO_ASYNC_GENERATOR
+
+
+class Instrumenter(object):
+    ''' Times calls of the functions of the selected modules.
+
+    :param modules: Names of the modules to instrument, a name also selects its
+                    submodules.
+    :param qualnames: Optional :func:`fnmatch.fnmatch` patterns, only functions whose
+                      full name (``module.qualname``) matches one of them are timed.
+    :param exclude: Patterns of full names that are never timed.
+    :param sample_every: Only time one in `sample_every` calls of the selected
+                         functions, the timers are created with this
+                         :attr:`~caliper.metric.Timer.sample_every` and still count
+                         every call.
+    :param registry: The :class:`~caliper.registry.Registry` to create timers in,
+                     defaults to the registry of the ``caliper`` module.
+
+    Generators and coroutines are not timed. The instrumenter is a context manager:
+
+    >>> with Instrumenter(['json']):
+    ...     import json; _ = json.dumps({})
+
+    On Python versions before 3.12 only calls in the thread that started the
+    instrumenter and in threads started afterwards are timed.
+    '''
+
+    def __init__(self, modules, qualnames=None, exclude=None, sample_every=1,
+                 registry=None):
+        self._modules = tuple(modules)
+        self._qualnames = qualnames
+        self._exclude = exclude or ()
+        self._sample_every = sample_every
+        self._registry = registry
+        self._timers = {}
+        self._filenames = {}
+        self._local = threading.local()
+        self._backend = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        ''' Start timing calls. '''
+        if self._backend is not None:
+            raise RuntimeError('Instrumenter is already started')
+
+        if self._registry is None:
+            from caliper import default_registry
+            self._registry = default_registry
+
+        if hasattr(sys, 'monitoring'):
+            self._backend = _MonitoringBackend(self)
+        else:
+            self._backend = _ProfileBackend(self)
+        self._backend.start()
+
+    def stop(self):
+        ''' Stop timing calls. '''
+        if self._backend is not None:
+            self._backend.stop()
+            self._backend = None
+
+    def name(self, module, code):
+        ''' Returns the timer name for `code` of `module`. '''
+        qualname = getattr(code, 'co_qualname', code.co_name)
+        return ('%s.%s' % (module, qualname)).replace('<', '').replace('>', '')
+
+    def selects(self, module, name):
+        ''' Returns ``True`` if the function with full `name` in `module` is timed. '''
+        if not any(module == m or module.startswith(m + '.') for m in self._modules):
+            return False
+        if self._qualnames is not None and \
+                not any(fnmatchcase(name, p) for p in self._qualnames):
+            return False
+        return not any(fnmatchcase(name, p) for p in self._exclude)
+
+    def _timer(self, code, frame):
+        ''' Returns the timer for `code`, or ``None`` if it isn't timed. '''
+        timer = self._timers.get(code, _NOT_SEEN)
+        if timer is _NOT_SEEN:
+            timer = None
+            if not code.co_flags & _SKIPPED_FLAGS:
+                module = self._module(code, frame)
+                name = module and self.name(module, code)
+                if name and self.selects(module, name):
+                    timer = self._registry.get_or_create_metric(
+                        Timer, name, None, self._sample_every)
+            self._timers[code] = timer
+        return timer
+
+    def _module(self, code, frame):
+        if frame is not None and frame.f_code is code:
+            return frame.f_globals.get('__name__')
+
+        filename = code.co_filename
+        if filename not in self._filenames:
+            self._filenames[filename] = None
+            for name, module in list(sys.modules.items()):
+                if getattr(module, '__file__', None) == filename:
+                    self._filenames[filename] = name
+                    break
+        return self._filenames[filename]
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = stack = []
+            return stack
+
+    def _enter(self, code, timer):
+        # Sample like Timer.time, a call that isn't timed is counted on return.
+        if timer._sample_every > 1:
+            timer._countdown -= 1
+            if timer._countdown > 0:
+                self._stack().append((code, timer, None))
+                return
+            timer._countdown = timer._sample_every
+        self._stack().append((code, timer, default_timer()))
+
+    def _exit(self, code):
+        ended = default_timer()
+        stack = self._stack()
+        if stack and stack[-1][0] is code:
+            _, timer, started = stack.pop()
+            if started is None:
+                timer._skipped += 1
+            else:
+                timer._record(ended - started)
+
+
+class _ProfileBackend(object):
+
+    def __init__(self, instrumenter):
+        self._instrumenter = instrumenter
+        self._active = False
+
+    def start(self):
+        self._active = True
+        threading.setprofile(self._profile)
+        sys.setprofile(self._profile)
+
+    def stop(self):
+        # The profile function of other threads can't be removed from here, threads
+        # started in the meantime remove it themselves on their next event.
+        self._active = False
+        sys.setprofile(None)
+        threading.setprofile(None)
+
+    def _profile(self, frame, event, arg):
+        if not self._active:
+            sys.setprofile(None)
+        elif event == 'call':
+            timer = self._instrumenter._timer(frame.f_code, frame)
+            if timer is not None:
+                self._instrumenter._enter(frame.f_code, timer)
+        elif (event == 'return' and
+              self._instrumenter._timers.get(frame.f_code) is not None):
+            self._instrumenter._exit(frame.f_code)
+
+
+class _MonitoringBackend(object):
+
+    def __init__(self, instrumenter):
+        self._instrumenter = instrumenter
+        self._monitoring = sys.monitoring
+        self._tool = sys.monitoring.PROFILER_ID
+
+    def start(self):
+        monitoring = self._monitoring
+        events = monitoring.events
+        monitoring.use_tool_id(self._tool, 'caliper')
+        monitoring.register_callback(self._tool, events.PY_START, self._start)
+        monitoring.register_callback(self._tool, events.PY_RETURN, self._return)
+        monitoring.register_callback(self._tool, events.PY_UNWIND, self._unwind)
+        # Locations disabled by an earlier instrumenter with other filters.
+        monitoring.restart_events()
+        monitoring.set_events(self._tool,
+                              events.PY_START | events.PY_RETURN | events.PY_UNWIND)
+
+    def stop(self):
+        monitoring = self._monitoring
+        events = monitoring.events
+        monitoring.set_events(self._tool, 0)
+        for event in (events.PY_START, events.PY_RETURN, events.PY_UNWIND):
+            monitoring.register_callback(self._tool, event, None)
+        monitoring.free_tool_id(self._tool)
+
+    def _start(self, code, offset):
+        timer = self._instrumenter._timer(code, sys._getframe(1))
+        if timer is None:
+            return self._monitoring.DISABLE
+        self._instrumenter._enter(code, timer)
+
+    def _return(self, code, offset, retval):
+        timer = self._instrumenter._timers.get(code, _NOT_SEEN)
+        if timer is None:
+            return self._monitoring.DISABLE
+        if timer is not _NOT_SEEN:
+            self._instrumenter._exit(code)
+
+    def _unwind(self, code, offset, exception):
+        if self._instrumenter._timers.get(code) is not None:
+            self._instrumenter._exit(code)
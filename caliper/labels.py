@@ -0,0 +1,90 @@
+'''
+    Labels
+    ~~~~~~
+    Label sets qualify a metric name with ``name=value`` pairs, such as the handler
+    and status of an HTTP request timer. Label sets are interned: equal label sets
+    are the same object, which makes them cheap to hash and compare.
+'''
+
+import weakref
+
+from .util import is_identifier
+
+
+_interned = weakref.WeakValueDictionary()
+
+
+class LabelSet(object):
+    ''' An immutable, interned set of labels. Use :func:`labelset` to create one.
+
+    Label values are converted to strings, ``status=200`` and ``status='200'`` are
+    the same label.
+    '''
+
+    __slots__ = ('_items', '_hash', '__weakref__')
+
+    def __init__(self, items):
+        self._items = items
+        self._hash = hash(items)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        return self is other or (isinstance(other, LabelSet) and
+                                 self._items == other._items)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return (name for name, _ in self._items)
+
+    def __contains__(self, name):
+        return any(n == name for n, _ in self._items)
+
+    def __getitem__(self, name):
+        for n, value in self._items:
+            if n == name:
+                return value
+        raise KeyError(name)
+
+    def __reduce__(self):
+        return (labelset, (dict(self._items),))
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def items(self):
+        ''' Returns the ``(name, value)`` pairs ordered by name. '''
+        return self._items
+
+    def __repr__(self):
+        return 'LabelSet(%s)' % ', '.join('%s=%r' % item for item in self._items)
+
+
+def labelset(labels):
+    ''' Returns the interned :class:`LabelSet` for the `labels` mapping. '''
+    items = tuple(sorted((name, str(value)) for name, value in labels.items()))
+    existing = _interned.get(items)
+    if existing is not None:
+        return existing
+
+    for name, _ in items:
+        if not is_identifier(name):
+            raise ValueError("'%s' is an invalid label name" % name)
+
+    return _interned.setdefault(items, LabelSet(items))
+
+
+#: The label set of metrics without labels.
+NO_LABELS = labelset({})
+
+#: The label set that label sets beyond the cardinality limit of a metric map to.
+OVERFLOW_LABELS = labelset({'overflow': 'true'})
@@ -1,23 +1,39 @@
 
-from datetime import datetime
-from math import exp
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from math import ceil, exp, sqrt
+from timeit import default_timer
 
 from .reservoir import ExponentiallyDecayingReservoir
+from .snapshot import DEFAULT_QUANTILES
+
+
+#: The innermost :class:`Timer.SpanContext` that is running in the current context.
+_current_span = ContextVar('caliper_span', default=None)
 
 
 class SamplingMetric(object):
     ''' Base class for metrics that use a reservoir. '''
 
+    __slots__ = ()
+
     @staticmethod
     def default_reservoir():
         return ExponentiallyDecayingReservoir()
 
     def __init__(self, reservoir=None):
-        self._reservoir = reservoir or SamplingMetric.default_reservoir()
+        if reservoir is None:
+            reservoir = SamplingMetric.default_reservoir()
+        self._reservoir = reservoir
 
     def snapshot(self):
         return self._reservoir.snapshot()
 
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        ''' Returns a :class:`~caliper.snapshot.Summary` with only the given
+        `quantiles`, see :meth:`~caliper.reservoir.BaseReservoir.summary`. '''
+        return self._reservoir.summary(quantiles)
+
 
 class Counter(object):
     ''' A counter metric. '''
@@ -50,6 +66,10 @@ class Gauge(object):
     :property:`value` setter.
     '''
 
+    #: Seconds :meth:`~caliper.registry.Registry.collect_gauges` waits for this gauge,
+    #: ``None`` means the timeout passed to the collection applies.
+    timeout = None
+
     def __init__(self):
         self._value = None
 
@@ -65,23 +85,226 @@ class Gauge(object):
         return self._value
 
 
-class Histogram(SamplingMetric, Counter):
-    ''' A metric that calculates the distribution of a value. '''
+class CachedGauge(Gauge):
+    ''' A gauge that caches the result of :meth:`get_value` for `ttl` seconds, for
+    gauges that are expensive to evaluate.
+
+    Setting :attr:`value` updates the cached value.
+    '''
+
+    def __init__(self, ttl):
+        super(CachedGauge, self).__init__()
+        self._ttl = timedelta(seconds=ttl)
+        self._expires = datetime.min
+
+    @property
+    def value(self):
+        now = datetime.now()
+        if now >= self._expires:
+            self._cached = self.get_value()
+            self._expires = now + self._ttl
+        return self._cached
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        self._expires = datetime.min
+
+    def invalidate(self):
+        ''' Evaluate :meth:`get_value` on the next read of :attr:`value`. '''
+        self._expires = datetime.min
+
+
+class DerivedGauge(Gauge):
+    ''' A gauge whose value is computed from other metrics.
+
+    :param func: Called with `metrics` to compute the value.
+    :param metrics: The metrics the value is derived from.
+
+    >>> hits, misses = Counter(), Counter()
+    >>> total = DerivedGauge(lambda h, m: h.count + m.count, hits, misses)
+    '''
+
+    def __init__(self, func, *metrics):
+        super(DerivedGauge, self).__init__()
+        self._func = func
+        self._metrics = metrics
+
+    def get_value(self):
+        return self._func(*self._metrics)
+
+
+class RatioGauge(Gauge):
+    ''' A gauge that reports the ratio of two values, such as a cache hit ratio.
+
+    :param numerator: Callable that returns the numerator.
+    :param denominator: Callable that returns the denominator.
+
+    The value is ``nan`` while the denominator is zero.
+
+    >>> hits, calls = Counter(), Counter()
+    >>> ratio = RatioGauge(lambda: hits.count, lambda: calls.count)
+    '''
+
+    def __init__(self, numerator, denominator):
+        super(RatioGauge, self).__init__()
+        self._numerator = numerator
+        self._denominator = denominator
+
+    def get_value(self):
+        denominator = self._denominator()
+        if not denominator:
+            return float('nan')
+        return self._numerator() / float(denominator)
+
+
+class RunningStatistics(object):
+    ''' Mixin for metrics that keep the exact :attr:`sum`, :attr:`min`, :attr:`max`,
+    :attr:`mean` and :attr:`variance` of the values they are updated with, using
+    Welford's algorithm for the variance.
+
+    Subclasses update ``_n``, ``_sum``, ``_min``, ``_max``, ``_mean`` and ``_m2``
+    inline in their update path, see :meth:`Histogram.update`.
+    '''
+
+    __slots__ = ()
+
+    def _init_statistics(self):
+        self._n = 0
+        self._sum = 0
+        self._min = 0
+        self._max = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _merge_statistics(self, other):
+        ''' Combine the statistics of `other` into these, using the parallel variance
+        algorithm of Chan et al. '''
+        n = self._n + other._n
+        if not other._n:
+            return
+        if not self._n:
+            self._min, self._max = other._min, other._max
+        else:
+            self._min = min(self._min, other._min)
+            self._max = max(self._max, other._max)
+        delta = other._mean - self._mean
+        self._m2 += other._m2 + delta * delta * self._n * other._n / n
+        self._mean += delta * other._n / n
+        self._sum += other._sum
+        self._n = n
+
+    @property
+    def sum(self):
+        ''' The sum of all values. '''
+        return self._sum
+
+    @property
+    def min(self):
+        ''' The smallest value, 0 if there are none. '''
+        return self._min
+
+    @property
+    def max(self):
+        ''' The largest value, 0 if there are none. '''
+        return self._max
+
+    @property
+    def mean(self):
+        ''' The mean of all values, 0 if there are none. '''
+        return self._mean
+
+    @property
+    def variance(self):
+        ''' The sample variance of all values, 0 if there are less than two. '''
+        if self._n <= 1:
+            return 0.0
+        return self._m2 / (self._n - 1)
+
+    @property
+    def stddev(self):
+        ''' The sample standard deviation of all values. '''
+        return sqrt(self.variance)
+
+
+class Histogram(SamplingMetric, Counter, RunningStatistics):
+    ''' A metric that calculates the distribution of a value.
+
+    Besides the sampled distribution in its reservoir, a histogram keeps the exact
+    running statistics of :class:`RunningStatistics` over all values.
+    '''
 
     def __init__(self, reservoir=None):
         SamplingMetric.__init__(self, reservoir)
         Counter.__init__(self)
+        self._init_statistics()
 
     def update(self, value):
-        Counter.inc(self)
+        self._count += 1
         self._reservoir.update(value)
 
+        n = self._n = self._n + 1
+        self._sum += value
+        if n == 1:
+            self._min = self._max = value
+        elif value < self._min:
+            self._min = value
+        elif value > self._max:
+            self._max = value
+        delta = value - self._mean
+        self._mean += delta / n
+        self._m2 += delta * (value - self._mean)
+
+    def merge(self, other):
+        ''' Add the values of `other`, a histogram of a different part of the same
+        stream, for instance recorded by another process. The reservoirs have to
+        support :meth:`~caliper.reservoir.BaseReservoir.merge`. '''
+        self._reservoir.merge(other._reservoir)
+        self._count += other._count
+        self._merge_statistics(other)
+
+
+class Timer(SamplingMetric, RunningStatistics):
+    ''' A timer.
+
+    :param sample_every: Only time one in `sample_every` calls made through
+                         :meth:`time`. Every call is still counted.
+    :param overhead_budget: Adapt `sample_every` so that timing costs at most this
+                            fraction of the duration of the timed code, for instance
+                            ``0.01`` for 1%.
+
+    Sampling is meant for code that runs so often that timing each call costs more
+    than the code itself. The durations of the calls that aren't timed are not
+    recorded, so the snapshot of a sampling timer is marked as
+    :attr:`~caliper.snapshot.Snapshot.sampled`. :attr:`count` and the rates of
+    :attr:`meter` include every call.
+
+    The running statistics of :class:`RunningStatistics` cover the recorded
+    durations, calls that weren't timed are not included.
+
+    :param spans: Attribute time to nested contexts. :meth:`time` records the
+                  duration including nested contexts of all span timers as usual,
+                  and the duration excluding them (the self time) in the sibling
+                  histogram :attr:`exclusive`. Pass a reservoir instead of ``True``
+                  to use it for the exclusive durations.
+
+    Spans are tracked with :mod:`contextvars`, so they nest across ``await`` and
+    into :mod:`asyncio` tasks and threads that run in a copy of the context.
+    Children that run concurrently are only subtracted once from the exclusive
+    duration of their parent. Span timers time every call, they can't sample.
+    '''
+
+    __slots__ = ('_reservoir', '_meter', '_sample_every', '_overhead_budget',
+                 '_countdown', '_skipped', '_cost', '_duration', '_exclusive',
+                 '_n', '_sum', '_min', '_max', '_mean', '_m2', '__weakref__')
 
-class Timer(SamplingMetric):
-    ''' A timer. '''
+    MAX_SAMPLE_EVERY = 10000
 
     class Context(object):
 
+        __slots__ = ('_timer', '_update_on_success', '_update_on_failure', '_aborted',
+                     '_started')
+
         def __init__(self, timer, update_on_success, update_on_failure):
             self._timer = timer
             self._update_on_success = update_on_success
@@ -92,20 +315,73 @@ class Timer(SamplingMetric):
             self._aborted = True
 
         def __enter__(self):
-            self._started = datetime.now()
+            self._started = default_timer()
             return self
 
         def __exit__(self, exc_type, *args):
             if not self._aborted:
-                delta = (datetime.now() - self._started).total_seconds()
+                delta = default_timer() - self._started
                 if exc_type and self._update_on_failure or \
                         exc_type is None and self._update_on_success:
-                    self._timer.update(delta)
+                    self._timer._record(delta)
 
-    def __init__(self, reservoir=None):
+    class SkippedContext(Context):
+        ''' A context that counts a call without timing it. '''
+
+        __slots__ = ()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, *args):
+            if not self._aborted:
+                if exc_type and self._update_on_failure or \
+                        exc_type is None and self._update_on_success:
+                    self._timer._skipped += 1
+
+    class SpanContext(Context):
+        ''' A context that records its duration excluding nested span contexts. '''
+
+        __slots__ = ('_parent', '_token', '_children')
+
+        def __enter__(self):
+            self._parent = _current_span.get()
+            self._token = _current_span.set(self)
+            self._children = []
+            self._started = default_timer()
+            return self
+
+        def __exit__(self, exc_type, *args):
+            ended = default_timer()
+            _current_span.reset(self._token)
+            if self._parent is not None:
+                self._parent._children.append((self._started, ended))
+            if not self._aborted:
+                if exc_type and self._update_on_failure or \
+                        exc_type is None and self._update_on_success:
+                    delta = ended - self._started
+                    covered = _covered(self._children, self._started, ended)
+                    exclusive = max(0.0, delta - covered)
+                    self._timer._record(delta)
+                    self._timer._exclusive.update(exclusive)
+
+    def __init__(self, reservoir=None, sample_every=1, overhead_budget=None, spans=False):
+        # An empty reservoir is falsy, so compare with False and None.
+        spans = None if spans is False else spans
+        if spans is not None and (sample_every > 1 or overhead_budget is not None):
+            raise ValueError('A span timer can not sample')
         super(Timer, self).__init__(reservoir)
-        self._histogram = Histogram(reservoir)
+        self._exclusive = None
+        if spans is not None:
+            self._exclusive = Histogram(None if spans is True else spans)
         self._meter = Meter()
+        self._init_statistics()
+        self._sample_every = sample_every
+        self._overhead_budget = overhead_budget
+        self._countdown = 0
+        self._skipped = 0
+        self._cost = None
+        self._duration = None
 
     def time(self, update_on_success=True, update_on_failure=True):
         ''' Returns a context manager that records time.
@@ -118,16 +394,113 @@ class Timer(SamplingMetric):
         The context manager has an :meth:`abort` method that prevents the duration
         from being recorded regardless of the configuration of the manager.
         '''
+        if self._exclusive is not None:
+            return Timer.SpanContext(self, update_on_success, update_on_failure)
+        if self._sample_every > 1:
+            self._countdown -= 1
+            if self._countdown > 0:
+                return Timer.SkippedContext(self, update_on_success, update_on_failure)
+            self._countdown = self._sample_every
         return Timer.Context(self, update_on_success, update_on_failure)
 
+    @property
+    def count(self):
+        ''' The number of recorded durations, including calls that weren't timed. '''
+        return self._meter.count + self._skipped
+
+    @property
+    def meter(self):
+        ''' The :class:`Meter` that counts the calls. '''
+        self._flush()
+        return self._meter
+
+    @property
+    def exclusive(self):
+        ''' The :class:`Histogram` of durations excluding nested span contexts, or
+        ``None`` if this isn't a span timer. '''
+        return self._exclusive
+
+    @property
+    def sample_every(self):
+        ''' One in this many calls made through :meth:`time` is timed. '''
+        return self._sample_every
+
     def update(self, duration):
         ''' Add `duration` in seconds. '''
         if duration > 0:
-            self._histogram.update(duration)
-            self._meter.mark()
+            self._reservoir.update(duration)
+            self._meter.mark(1 + self._skipped)
+            self._skipped = 0
+
+            n = self._n = self._n + 1
+            self._sum += duration
+            if n == 1:
+                self._min = self._max = duration
+            elif duration < self._min:
+                self._min = duration
+            elif duration > self._max:
+                self._max = duration
+            delta = duration - self._mean
+            self._mean += delta / n
+            self._m2 += delta * (duration - self._mean)
 
     def snapshot(self):
-        return self._histogram.snapshot()
+        return self._mark_sampled(self._reservoir.snapshot())
+
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        ''' Returns a :class:`~caliper.snapshot.Summary` with only the given
+        `quantiles`, see :meth:`~caliper.reservoir.BaseReservoir.summary`. '''
+        return self._mark_sampled(self._reservoir.summary(quantiles))
+
+    def _mark_sampled(self, snapshot):
+        if self._sample_every > 1 or self._skipped or self._n < self._meter.count:
+            snapshot.sampled = True
+            snapshot.sample_rate = self._n / float(self.count)
+        return snapshot
+
+    def _flush(self):
+        if self._skipped:
+            self._meter.mark(self._skipped)
+            self._skipped = 0
+
+    def _record(self, duration):
+        if self._overhead_budget is None:
+            self.update(duration)
+            return
+
+        began = default_timer()
+        self.update(duration)
+        cost = default_timer() - began
+        self._adapt(duration, cost)
+
+    def _adapt(self, duration, cost):
+        ''' Update `sample_every` from moving averages of the duration of the timed
+        code and the cost of recording it. '''
+        if self._duration is None:
+            self._duration, self._cost = duration, cost
+        else:
+            self._duration += 0.1 * (duration - self._duration)
+            self._cost += 0.1 * (cost - self._cost)
+
+        if self._duration > 0:
+            wanted = int(ceil(self._cost / (self._overhead_budget * self._duration)))
+            self._sample_every = max(1, min(wanted, Timer.MAX_SAMPLE_EVERY))
+
+
+def _covered(intervals, start, end):
+    ''' Returns the length of the union of `intervals` clipped to ``[start, end]``. '''
+    if len(intervals) == 1:
+        began, ended = intervals[0]
+        return max(0.0, min(ended, end) - max(began, start))
+    covered = 0.0
+    reach = start
+    for began, ended in sorted(intervals):
+        began = max(began, reach)
+        ended = min(ended, end)
+        if ended > began:
+            covered += ended - began
+            reach = ended
+    return covered
 
 
 class Meter(object):
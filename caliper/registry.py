@@ -0,0 +1,588 @@
+'''
+    Registry
+    ~~~~~~~~
+    A registry holds metrics by name and type, so the same metric can be looked
+    up from anywhere in an application.
+'''
+
+import sys
+import threading
+import time
+import weakref
+
+from _thread import get_ident
+from collections import OrderedDict, namedtuple
+from itertools import count, islice
+from math import sqrt
+from timeit import default_timer
+
+from . import metric as _metric_module, reservoir as _reservoir_module
+from .labels import NO_LABELS, OVERFLOW_LABELS, labelset
+from .metric import Counter, Gauge, Histogram, Meter, Timer
+from .util import is_identifier
+
+
+class Registry(object):
+    ''' A collection of metrics, keyed by a dotted name, the metric type and an
+    optional set of labels.
+
+    :param max_label_sets: The maximum number of label sets per name and type,
+                           metrics created with more label sets than that share a
+                           single metric labelled with
+                           :data:`~caliper.labels.OVERFLOW_LABELS`.
+    :param max_metrics: The maximum number of named metrics, creating a metric
+                        beyond it evicts the least recently active one.
+    :param idle_timeout: Seconds after which :meth:`sweep` evicts metrics that
+                         haven't been updated.
+    :param on_evict: Called with ``(key, labels, metric)`` for every evicted
+                     metric, for instance to report its final values.
+
+    Activity is detected by :meth:`sweep`, which compares the counts of metrics
+    with those seen by the previous sweep, so updating a metric costs nothing
+    extra. Call it from the reporting loop. Gauges with a callback are always
+    considered active. Metrics created without a name are held weakly and
+    disappear together with the last reference to them.
+
+    Creating, registering and evicting metrics is serialized by a lock, looking up
+    an existing metric doesn't take it. `on_evict` is called after the lock is
+    released.
+    '''
+
+    DEFAULT_GAUGE_TIMEOUT = 1.0
+    DEFAULT_MAX_LABEL_SETS = 1000
+    DEFAULT_CAPTURE_TIMEOUT = 1.0
+
+    def __init__(self, max_label_sets=DEFAULT_MAX_LABEL_SETS, max_metrics=None,
+                 idle_timeout=None, on_evict=None):
+        self.max_metrics = max_metrics
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict
+        self._max_label_sets = max_label_sets
+        self._metrics = {}
+        self._families = {}
+        self._lookup = {}
+        # The lookup keys of each metric, to drop them from the cache on eviction.
+        self._lookup_keys = {}
+        self._inflight = {}
+        self._activity = OrderedDict()
+        self._anonymous = weakref.WeakValueDictionary()
+        self._anonymous_ids = count()
+        self._lock = threading.RLock()
+
+    def get_or_create_metric(self, cls, name=None, /, *args, **labels):
+        ''' Returns the metric of type `cls` registered under `name` and `labels`,
+        it is created with `args` if it doesn't exist yet. A metric without a name
+        gets a unique one and is only held weakly by the registry.
+
+        Keyword arguments are labels, including ``cls`` and ``name``. Constructor
+        arguments can only be passed positionally, a label named like one raises
+        :exc:`TypeError`. Use :meth:`register` for metrics that need keyword
+        arguments.
+
+        >>> from caliper.metric import Timer
+        >>> registry = Registry()
+        >>> timer = registry.get_or_create_metric(Timer, 'http.request',
+        ...                                       name='users', status=200)
+        '''
+        if name is None:
+            return self._create_anonymous(cls, args, labels)
+
+        lookup = _lookup_key(cls, name, labels) if labels else (cls, name)
+        metric = self._lookup.get(lookup)
+        if metric is None:
+            metric = self._create(cls, name, args, labels, lookup)
+        return metric
+
+    def _create(self, cls, name, args, labels, lookup):
+        _check_labels(cls, labels)
+        key = _split_registry_key('%s.%s' % (name, cls.__name__))
+        label_set = labelset(labels) if labels else NO_LABELS
+        with self._lock:
+            metric, evicted = self._get_or_add(cls, key, label_set, args, lookup)
+        self._notify(evicted)
+        return metric
+
+    def _get_or_add(self, cls, key, label_set, args, lookup):
+        family = self._families.setdefault(key, {})
+
+        cache = lookup is not None
+        if label_set not in family and len(family) >= self._max_label_sets:
+            label_set = OVERFLOW_LABELS
+            cache = False
+
+        metric = family.get(label_set)
+        evicted = []
+        if metric is None:
+            metric = cls(*args)
+            evicted = self._add(key, label_set, metric)
+        elif not type(metric) is cls:
+            raise TypeError('A metric with key %s already exists with type %s' %
+                            ('.'.join(key), metric.__class__))
+
+        # Another thread may have cached the lookup since it was missed.
+        if cache and lookup not in self._lookup:
+            self._lookup[lookup] = metric
+            self._lookup_keys.setdefault((key, label_set), []).append(lookup)
+        return metric, evicted
+
+    def _create_anonymous(self, cls, args, labels):
+        _check_labels(cls, labels)
+        name = 'anonymous%d' % next(self._anonymous_ids)
+        key = _split_registry_key('%s.%s' % (name, cls.__name__))
+        metric = cls(*args)
+        self._anonymous[(key, labelset(labels))] = metric
+        return metric
+
+    def _add(self, key, label_set, metric):
+        self._families.setdefault(key, {})[label_set] = metric
+        self._metrics[(key, label_set)] = metric
+        self._activity[(key, label_set)] = (_fingerprint(metric), default_timer())
+
+        if self.max_metrics is not None and len(self._metrics) > self.max_metrics:
+            return self._evict([next(iter(self._activity))])
+        return []
+
+    def sweep(self, now=None):
+        ''' Evict the metrics that have been idle for longer than `idle_timeout` and
+        the least recently active metrics beyond `max_metrics`.
+
+        :param now: The current :func:`timeit.default_timer` time.
+        :returns: A list of ``(key, labels, metric)`` tuples of evicted metrics.
+        '''
+        now = default_timer() if now is None else now
+        with self._lock:
+            idle = self._idle(now)
+            if self.max_metrics is not None:
+                idle.extend(self._least_recently_active(idle))
+            evicted = self._evict(idle)
+        self._notify(evicted)
+        return evicted
+
+    def _idle(self, now):
+        ''' Marks the metrics that changed since the last sweep as active and
+        returns the idents of those idle for longer than `idle_timeout`. '''
+        idle = []
+        for ident, metric in list(self._metrics.items()):
+            activity = self._activity.get(ident)
+            if activity is None:
+                continue
+            fingerprint = _fingerprint(metric)
+            previous, last_active = activity
+            if fingerprint is _ACTIVE or fingerprint != previous:
+                self._activity[ident] = (fingerprint, now)
+                self._activity.move_to_end(ident)
+            elif (self.idle_timeout is not None and
+                  now - last_active >= self.idle_timeout):
+                idle.append(ident)
+        return idle
+
+    def _least_recently_active(self, idle):
+        ''' The idents of the least recently active metrics beyond `max_metrics`
+        that aren't `idle` already. '''
+        excess = len(self._metrics) - len(idle) - self.max_metrics
+        if excess <= 0:
+            return []
+        idle = set(idle)
+        return list(islice((i for i in list(self._activity) if i not in idle), excess))
+
+    def _evict(self, idents):
+        evicted = []
+        for ident in idents:
+            metric = self._remove(ident)
+            if metric is not None:
+                evicted.append(ident + (metric,))
+        return evicted
+
+    def _notify(self, evicted):
+        if evicted and self.on_evict is not None:
+            for key, label_set, metric in evicted:
+                self.on_evict(key, label_set, metric)
+
+    def _remove(self, ident):
+        metric = self._metrics.pop(ident, None)
+        if metric is not None:
+            key, label_set = ident
+            self._activity.pop(ident, None)
+            self._inflight.pop(ident, None)
+            for lookup in self._lookup_keys.pop(ident, ()):
+                self._lookup.pop(lookup, None)
+            family = self._families.get(key, {})
+            family.pop(label_set, None)
+            if not family:
+                self._families.pop(key, None)
+        return metric
+
+    def register(self, name, metric, /, **labels):
+        ''' Add an existing `metric` under `name` and `labels`, this is useful for
+        metrics that need constructor arguments such as a
+        :class:`~caliper.metric.DerivedGauge`. Keyword arguments are labels,
+        including ``name`` and ``metric``.
+
+        :returns: `metric`.
+        '''
+        key = _split_registry_key('%s.%s' % (name, metric.__class__.__name__))
+        label_set = labelset(labels)
+        with self._lock:
+            if (key, label_set) in self._metrics:
+                raise ValueError('A metric with key %s %r already exists' %
+                                 ('.'.join(key), label_set))
+            evicted = self._add(key, label_set, metric)
+        self._notify(evicted)
+        return metric
+
+    def items(self):
+        ''' Returns a list of ``(key, labels, metric)`` tuples. '''
+        metrics = list(self._metrics.items()) + list(self._anonymous.items())
+        return [(key, labels, metric) for (key, labels), metric in metrics]
+
+    def gauges(self):
+        ''' Returns a list of ``(key, labels, gauge)`` tuples for all gauges. '''
+        return [(key, labels, metric) for key, labels, metric in self.items()
+                if isinstance(metric, Gauge)]
+
+    def family(self, cls, name):
+        ''' Returns a mapping of :class:`~caliper.labels.LabelSet` to metric for all
+        metrics of type `cls` registered under `name`.
+        '''
+        key = _split_registry_key('%s.%s' % (name, cls.__name__))
+        return dict(self._families.get(key, {}))
+
+    def group_by(self, cls, name, *label_names):
+        ''' Groups the metrics of type `cls` registered under `name` by the values of
+        `label_names`, which allows aggregating across the other labels.
+
+        :returns: A mapping of tuples of label values to lists of metrics, a metric
+                  that lacks a label is grouped under ``None`` for that label.
+
+        >>> from caliper.metric import Counter
+        >>> registry = Registry()
+        >>> for handler in ('users', 'groups'):
+        ...     registry.get_or_create_metric(Counter, 'http.requests',
+        ...                                   handler=handler, status=200).inc()
+        >>> groups = registry.group_by(Counter, 'http.requests', 'status')
+        >>> sum(c.count for c in groups[('200',)])
+        2
+        '''
+        groups = {}
+        for label_set, metric in self.family(cls, name).items():
+            group = tuple(label_set.get(n) for n in label_names)
+            groups.setdefault(group, []).append(metric)
+        return groups
+
+    def collect_gauges(self, timeout=DEFAULT_GAUGE_TIMEOUT, default=None, executor=None):
+        ''' Evaluate all gauges and return a mapping of ``(key, labels)`` to value.
+
+        Gauges with a callback (an overridden :meth:`~caliper.metric.Gauge.get_value`)
+        are evaluated concurrently in a thread pool, so the collection takes as long
+        as the slowest gauge rather than the sum of all of them.
+
+        :param timeout: Seconds to wait for a gauge that doesn't set its own
+                        :attr:`~caliper.metric.Gauge.timeout`.
+        :param default: Value reported for gauges that time out or raise.
+        :param executor: A :class:`concurrent.futures.Executor` to use, a new thread
+                         pool is created (and left to finish in the background) if
+                         it is omitted.
+
+        A gauge that times out keeps running in the background. It isn't evaluated
+        again until that call has returned, so a stuck callback occupies at most
+        one thread.
+        '''
+        values, pending = _split_gauges(self.gauges())
+        if not pending:
+            return values
+
+        owned = executor is None
+        if owned:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=len(pending))
+
+        try:
+            values.update(self._wait_for_gauges(executor, pending, timeout, default))
+        finally:
+            if owned:
+                executor.shutdown(wait=False)
+
+        return values
+
+    def _wait_for_gauges(self, executor, pending, timeout, default):
+        started = default_timer()
+        futures = [(started + (gauge.timeout or timeout), key,
+                    self._submit_gauge(executor, key, gauge)) for key, gauge in pending]
+        values = {}
+        for deadline, key, future in sorted(futures, key=lambda f: f[0]):
+            try:
+                values[key] = future.result(max(0, deadline - default_timer()))
+            except Exception:
+                values[key] = default
+        return values
+
+    def _submit_gauge(self, executor, key, gauge):
+        future = self._inflight.get(key)
+        if future is None or future.done():
+            future = self._inflight[key] = executor.submit(getattr, gauge, 'value')
+        return future
+
+    def capture(self, samples=False, timeout=DEFAULT_CAPTURE_TIMEOUT):
+        ''' Returns a view of all metrics in which each metric is consistent, for
+        instance the count, sum and statistics of a timer belong to the same updates.
+
+        Across metrics the view is close to a point in time but not exact: no
+        metric is captured in the middle of an update, but a thread that updates
+        several metrics in a row can be switched out between two of them. Metrics
+        updated together by one thread can therefore differ by the updates that
+        thread has in flight, for instance a counter incremented right before a
+        timer may be one ahead of it.
+
+        Only the scalar state of each metric is read: counts, running statistics,
+        rates and the values of gauges without a callback, so a capture costs
+        O(metrics) and updating a metric costs nothing extra. Each attempt reads
+        the state twice while other threads are held off by raising the
+        process-wide :func:`sys.setswitchinterval`, which delays every other thread
+        of the process by up to 0.1 seconds. The attempt succeeds if both reads
+        match and no other thread is in the middle of updating a metric, which is
+        checked by walking the stack of every thread with the private
+        :func:`sys._current_frames`. A thread paused on the first instruction of a
+        metric method counts as not updating, since it hasn't changed anything
+        yet. Otherwise the capture backs off and retries. Captures are serialized,
+        so that each restores the switch interval it found.
+
+        :param samples: Also pin the values of the reservoirs of histograms and
+                        timers, which costs O(samples) while other threads are held
+                        off. Their snapshots are taken after they are resumed.
+        :param timeout: Seconds to retry before giving up with a
+                        :exc:`RuntimeError`.
+        :returns: A mapping of ``(key, labels)`` to :class:`State`. Gauges with a
+                  callback are left out, see :meth:`collect_gauges`.
+
+        This relies on the global interpreter lock of CPython.
+        '''
+        items = self.items()
+        deadline = default_timer() + timeout
+        if not _capture_lock.acquire(True, timeout):
+            raise RuntimeError('No consistent view of the registry within %s '
+                               'seconds' % timeout)
+        interval = sys.getswitchinterval()
+        try:
+            scalars, pinned = _read_consistently(items, samples, deadline, timeout)
+        finally:
+            sys.setswitchinterval(interval)
+            _capture_lock.release()
+        return _states(items, scalars, pinned)
+
+
+class State(namedtuple('State', 'count sum min max mean variance rates value snapshot')):
+    ''' The state of a metric as captured by :meth:`Registry.capture`. Fields that
+    don't apply to the metric are ``None``.
+
+    `rates` are the one, five and fifteen minute rates of meters and timers.
+    `snapshot` is only set for histograms and timers when samples are captured.
+    '''
+
+    __slots__ = ()
+
+    @property
+    def stddev(self):
+        if self.variance is None:
+            return None
+        return sqrt(self.variance)
+
+
+# Holds off other threads during a capture, longer for registries that take longer
+# to read. This bounds how long another thread can keep the interpreter when it
+# interrupts the reads.
+_CAPTURE_SWITCH_INTERVAL = 0.005
+_CAPTURE_MAX_SWITCH_INTERVAL = 0.1
+# Seconds to let other threads run before retrying a capture, short so that
+# retries are cheap with CPU bound writers.
+_CAPTURE_BACKOFF = 0.0001
+
+_WRITER_FILES = frozenset((_metric_module.__file__, _reservoir_module.__file__))
+# Functions of those modules that don't modify metrics, some may run user code.
+_READERS = frozenset(('value', 'get_value', 'snapshot', 'summary', 'values'))
+# The switch interval is global, only one capture may change it at a time.
+_capture_lock = threading.Lock()
+
+
+def _read_consistently(items, samples, deadline, timeout):
+    ''' Reads the scalars of the metrics of `items`, and pins their reservoirs if
+    `samples`, until two reads match while no other thread updates a metric.
+
+    :returns: A tuple of the lists of scalars and of pinned reservoirs.
+    '''
+    hold = _CAPTURE_SWITCH_INTERVAL
+    me = get_ident()
+    while True:
+        sys.setswitchinterval(hold)
+        started = time.thread_time()
+        first = [_scalars(metric) for _, _, metric in items]
+        pinned = [_pin(metric) for _, _, metric in items] if samples else None
+        second = [_scalars(metric) for _, _, metric in items]
+        if first == second and not _writing(me):
+            return first, pinned
+        # Hold the other threads off long enough to read the registry in one go,
+        # but not much longer: a thread that already waits for the interpreter can
+        # still interrupt the reads, and then runs for as long as they are held off.
+        elapsed = time.thread_time() - started
+        hold = min(max(_CAPTURE_SWITCH_INTERVAL, 4 * elapsed),
+                   _CAPTURE_MAX_SWITCH_INTERVAL)
+        if default_timer() >= deadline:
+            raise RuntimeError('No consistent view of the registry within %s '
+                               'seconds' % timeout)
+        # Let the other threads run briefly, they are switched out again at a random
+        # point, with some luck outside of an update.
+        sys.setswitchinterval(_CAPTURE_BACKOFF)
+        time.sleep(0)
+
+
+def _states(items, scalars, pinned):
+    states = {}
+    for i, (key, labels, metric) in enumerate(items):
+        if scalars[i] is None:
+            continue
+        snapshot = None
+        if pinned is not None and pinned[i] is not None:
+            snapshot = _pinned_snapshot(pinned[i], scalars[i])
+        states[(key, labels)] = State(*_variance(scalars[i][:8]), snapshot=snapshot)
+    return states
+
+
+def _scalars(metric):
+    ''' Returns a tuple of the fields of :class:`State` except the snapshot, followed
+    by the number of values the reservoir has seen, or ``None`` if the metric isn't
+    captured. '''
+    if isinstance(metric, Timer):
+        meter = metric._meter
+        return ((meter._count + metric._skipped,) + _statistics(metric) +
+                (_rates(meter), None, metric._reservoir._count))
+    if isinstance(metric, Histogram):
+        return ((metric._count,) + _statistics(metric) +
+                (None, None, metric._reservoir._count))
+    if isinstance(metric, (Meter, Counter)):
+        rates = _rates(metric) if isinstance(metric, Meter) else None
+        return (metric._count, None, None, None, None, None, rates, None, None)
+    if isinstance(metric, Gauge) and not _has_callback(metric):
+        return (None, None, None, None, None, None, None, metric._value, None)
+    return None
+
+
+def _statistics(metric):
+    # The raw fields rather than the variance, a value computed on every read never
+    # compares equal once it is NaN.
+    return (metric._sum, metric._min, metric._max, metric._mean,
+            (metric._n, metric._m2))
+
+
+def _variance(scalars):
+    ''' Replace the raw statistics of :func:`_statistics` with the variance. '''
+    raw = scalars[5]
+    if raw is None:
+        return scalars
+    n, m2 = raw
+    return scalars[:5] + (m2 / (n - 1) if n > 1 else 0.0,) + scalars[6:]
+
+
+def _rates(meter):
+    return (meter.m1rate.rate, meter.m5rate.rate, meter.m15rate.rate)
+
+
+def _pin(metric):
+    reservoir = getattr(metric, '_reservoir', None)
+    return None if reservoir is None else reservoir.copy()
+
+
+def _pinned_snapshot(reservoir, scalars):
+    snapshot = reservoir.snapshot()
+    count, recorded = scalars[0], scalars[8]
+    if recorded < count:
+        snapshot.sampled = True
+        snapshot.sample_rate = recorded / float(count)
+    return snapshot
+
+
+def _writing(me):
+    ''' Whether a thread other than `me` is in the middle of updating a metric. '''
+    for ident, top in sys._current_frames().items():
+        if ident == me:
+            continue
+        outermost = _outermost_writer(top)
+        # Threads are mostly switched out on calls, one that was switched out on
+        # entering a metric method hasn't changed anything yet.
+        if outermost is not None and (outermost is not top or top.f_lasti > 0):
+            return True
+    return False
+
+
+def _outermost_writer(frame):
+    ''' The outermost frame of a metric method that may modify the metric. '''
+    outermost = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename in _WRITER_FILES and code.co_name not in _READERS:
+            outermost = frame
+        frame = frame.f_back
+    return outermost
+
+
+_ACTIVE = object()
+
+
+def _fingerprint(metric):
+    ''' Returns a value that changes when `metric` is updated. '''
+    if isinstance(metric, Gauge):
+        return _ACTIVE if _has_callback(metric) else metric._value
+    return getattr(metric, 'count', _ACTIVE)
+
+
+def _lookup_key(cls, name, labels):
+    ''' The key of a labelled metric in the lookup cache, ``None`` for unhashable
+    label values, which are looked up by their label set instead. '''
+    try:
+        return (cls, name, frozenset(labels.items()))
+    except TypeError:
+        return None
+
+
+def _split_gauges(gauges):
+    ''' Splits `gauges`, ``(key, labels, gauge)`` tuples, into a mapping of
+    ``(key, labels)`` to the value of the gauges without a callback and a list of
+    ``((key, labels), gauge)`` pairs of the gauges with one. '''
+    values = {}
+    callbacks = []
+    for key, labels, gauge in gauges:
+        if _has_callback(gauge):
+            callbacks.append(((key, labels), gauge))
+        else:
+            values[(key, labels)] = gauge.value
+    return values, callbacks
+
+
+def _has_callback(gauge):
+    return ('get_value' in getattr(gauge, '__dict__', ()) or
+            type(gauge).get_value is not Gauge.get_value)
+
+
+_parameters = {}
+
+
+def _check_labels(cls, labels):
+    ''' Raises :exc:`TypeError` for labels named like a parameter of the constructor
+    of `cls`, which are most likely meant as constructor arguments. '''
+    parameters = _parameters.get(cls)
+    if parameters is None:
+        code = getattr(cls.__init__, '__code__', None)
+        names = ()
+        if code is not None:
+            names = code.co_varnames[1:code.co_argcount + code.co_kwonlyargcount]
+        parameters = _parameters[cls] = frozenset(names)
+    clash = parameters.intersection(labels)
+    if clash:
+        raise TypeError('%s() arguments must be passed positionally, %s would be '
+                        'labels' % (cls.__name__, ', '.join(sorted(clash))))
+
+
+def _split_registry_key(keystr):
+    key = tuple(keystr.split('.'))
+    if not all(is_identifier(part) for part in key):
+        raise ValueError("'%s' is in invalid registry key" % keystr)
+
+    return key
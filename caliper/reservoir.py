@@ -6,13 +6,12 @@
     good statistical properties.
 '''
 
-from random import randint
-
 from datetime import datetime, timedelta
-from math import exp
-from random import random
+from heapq import heappush, heapreplace
+from math import exp, floor, fsum, log, log1p
+from random import Random
 
-from .snapshot import Snapshot, WeightedSnapshot
+from .snapshot import DEFAULT_QUANTILES, Snapshot, WeightedSnapshot, summarize
 
 
 class BaseReservoir(object):
@@ -33,6 +32,34 @@ class BaseReservoir(object):
         '''
         return Snapshot(self._res)
 
+    def copy(self):
+        ''' Returns a copy of the reservoir that doesn't share the held values, for
+        taking a snapshot of it later. '''
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone._res = type(self._res)(self._res)
+        return clone
+
+    def merge(self, other):
+        ''' Add the values of `other`, a reservoir of the same type that saw a
+        different part of the stream, as if this reservoir had seen both parts. '''
+        raise NotImplementedError('%s can not be merged' % self.__class__.__name__)
+
+    def values(self):
+        ''' Returns an iterator over the values held by the reservoir, in no
+        particular order and without copying them. The reservoir must not be
+        updated while iterating. '''
+        return iter(self._res)
+
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        ''' Create a summary of the reservoir with only the given `quantiles`, which
+        is considerably cheaper than a snapshot for tail quantiles of large
+        reservoirs.
+
+        :returns: :class:`~caliper.snapshot.Summary`.
+        '''
+        return summarize(self._res, quantiles)
+
     def __len__(self):
         ''' Returns the total number of values added to the reservoir, regardless
         of the actual number of values a reservoir might hold.
@@ -40,19 +67,59 @@ class BaseReservoir(object):
         return self._count
 
 
-class Reservoir(BaseReservoir):
+class MomentsReservoir(BaseReservoir):
+    ''' Base class for unweighted reservoirs that keep the sum and the sum of squares
+    of the values they hold up to date, so a summary gets the mean and standard
+    deviation for free.
+
+    The sums are of the differences to one of the values, the shift, so that the
+    variance of large values that are close together doesn't cancel out.
+    '''
+
+    def __init__(self):
+        super(MomentsReservoir, self).__init__()
+        self._shift = 0.0
+        self._sum = 0.0
+        self._sum_squares = 0.0
+
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        return summarize(self._res, quantiles, self._sum, self._sum_squares,
+                         self._shift)
+
+    def _resum(self):
+        ''' Recompute the sums exactly, shifted by one of the values. '''
+        shift = self._shift = self._res[0] if self._res else 0.0
+        self._sum = fsum(x - shift for x in self._res)
+        self._sum_squares = fsum((x - shift) * (x - shift) for x in self._res)
+
+
+class Reservoir(MomentsReservoir):
     ''' A reservoir that stores all values added to it. '''
 
     def update(self, value):
+        if not self._count:
+            self._shift = value
         self._count += 1
         self._res.append(value)
+        value -= self._shift
+        self._sum += value
+        self._sum_squares += value * value
+
+    def merge(self, other):
+        self._count += other._count
+        self._res.extend(other._res)
+        self._resum()
 
 
-class SlidingWindowReservoir(BaseReservoir):
+class SlidingWindowReservoir(MomentsReservoir):
     ''' A reservoir that keeps the `size` most recent values added to it. '''
 
     DEFAULT_SIZE = 100
 
+    # Recompute the sums every this many times the window wrapped around, so the
+    # rounding errors of subtracting values that leave it don't accumulate.
+    RESUM_INTERVAL = 16
+
     def __init__(self, size=DEFAULT_SIZE):
         super(SlidingWindowReservoir, self).__init__()
         assert size > 0
@@ -60,47 +127,122 @@ class SlidingWindowReservoir(BaseReservoir):
         self._size = size
 
     def update(self, value):
-        if self._count < self._size:
+        count = self._count
+        if count < self._size:
+            if not count:
+                self._shift = value
             self._res.append(value)
+            value -= self._shift
+            self._sum += value
+            self._sum_squares += value * value
         else:
-            self._res[self._count % self._size] = value
-        self._count += 1
-
-
-class UniformReservoir(BaseReservoir):
+            index = count % self._size
+            old = self._res[index]
+            self._res[index] = value
+            if index == 0 and not count % (self._size * self.RESUM_INTERVAL):
+                # Also moves the shift along with the values in the window.
+                self._resum()
+            else:
+                value -= self._shift
+                old -= self._shift
+                self._sum += value - old
+                self._sum_squares += value * value - old * old
+        self._count = count + 1
+
+
+class UniformReservoir(MomentsReservoir):
     ''' A Sampling reservoir that represents a uniform sample of the input stream. Sampling
-    is done using Vitter's Algorithm R.
+    is done using Li's Algorithm L, which draws random numbers only for the values that
+    actually replace a sample instead of for every value once the reservoir is full.
+
+    :param rng: A :class:`random.Random` instance to draw from, a privately seeded
+                instance is created if it is omitted.
     '''
 
     DEFAULT_SIZE = 1028
 
-    def __init__(self, size=DEFAULT_SIZE):
+    def __init__(self, size=DEFAULT_SIZE, rng=None):
         super(UniformReservoir, self).__init__()
+        assert size > 0
         self._size = size
+        self._rng = rng or Random()
+        self._w = 1.0
+        self._next = None
 
     def update(self, value):
-        if self._count < self._size:
+        count = self._count
+        if count < self._size:
+            if not count:
+                self._shift = value
             self._res.append(value)
-        else:
-            index = randint(0, self._count - 1)
-            if index < self._size:
-                self._res[index] = value
-        self._count += 1
+            shifted = value - self._shift
+            self._sum += shifted
+            self._sum_squares += shifted * shifted
+            if count + 1 == self._size:
+                self._w = exp(log(_uniform(self._rng)) / self._size)
+                self._next = count + self._skip()
+        elif count == self._next:
+            index = int(self._rng.random() * self._size)
+            old = self._res[index] - self._shift
+            self._res[index] = value
+            value -= self._shift
+            self._sum += value - old
+            self._sum_squares += value * value - old * old
+            self._w *= exp(log(_uniform(self._rng)) / self._size)
+            self._next += self._skip()
+        self._count = count + 1
+
+    def merge(self, other):
+        ''' Merge `other`, a uniform reservoir of the same size, into a uniform sample
+        of both streams. The number of samples taken from each reservoir is drawn
+        from the hypergeometric distribution of the sizes of their streams. '''
+        if other._size != self._size:
+            raise ValueError('Can not merge uniform reservoirs of different sizes')
+        rng = self._rng
+        total = self._count + other._count
+        wanted = min(self._size, total)
+
+        # Draw which stream each sample comes from without replacement.
+        left, right, mine = self._count, other._count, 0
+        for _ in range(wanted):
+            if rng.random() * (left + right) < left:
+                mine += 1
+                left -= 1
+            else:
+                right -= 1
+
+        self._res = rng.sample(self._res, mine) + rng.sample(other._res, wanted - mine)
+        self._resum()
+        self._count = total
+        if total >= self._size:
+            # The largest of the `size` smallest of `total` uniform keys.
+            self._w = rng.betavariate(self._size, total - self._size + 1)
+            self._next = total - 1 + self._skip()
+
+    def _skip(self):
+        ''' Returns the distance to the next value that replaces a sample. '''
+        if self._w >= 1.0:
+            return 1
+        return int(floor(log(_uniform(self._rng)) / log1p(-self._w))) + 1
 
 
 class ExponentiallyDecayingReservoir(BaseReservoir):
     ''' A sampling reservoir that employs exponential decay. The reservoir attempts
     to strike a balance betwee storage requirements, recency and statistical accuracy.
+
+    :param rng: A :class:`random.Random` instance to draw from, a privately seeded
+                instance is created if it is omitted.
     '''
 
     DEFAULT_SIZE = 1028
     DEFAULT_ALPHA = 0.015
     RESCALE_THRESHOLD = timedelta(hours=1)
 
-    def __init__(self, size=DEFAULT_SIZE, alpha=DEFAULT_ALPHA):
+    def __init__(self, size=DEFAULT_SIZE, alpha=DEFAULT_ALPHA, rng=None):
         super(ExponentiallyDecayingReservoir, self).__init__()
         self._size = size
         self._alpha = alpha
+        self._rng = rng or Random()
         self._set_next_rescale()
         self._landmark = datetime.now()
         self._res = {}
@@ -114,15 +256,12 @@ class ExponentiallyDecayingReservoir(BaseReservoir):
         weight = self._sample_weight((timestamp - self._landmark).total_seconds())
         sample = (value, weight)
 
-        scale = random()
-        while scale == 0.0:
-            scale = random()
-        priority = weight / scale
+        priority = weight / _uniform(self._rng)
 
         if self._count < self._size:
             self._res[priority] = sample
         else:
-            first = sorted(self._res.keys())[0]
+            first = min(self._res)
             if first < priority and priority not in self._res:
                 self._res[priority] = sample
                 del self._res[first]
@@ -132,6 +271,13 @@ class ExponentiallyDecayingReservoir(BaseReservoir):
     def snapshot(self):
         return WeightedSnapshot(self._res.values())
 
+    def values(self):
+        return (value for value, _ in self._res.values())
+
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        ''' Summaries of weighted reservoirs are computed from a snapshot. '''
+        return self.snapshot().summary(quantiles)
+
     def _rescale_if_needed(self):
         if datetime.now() >= self._next_rescale:
             self._rescale()
@@ -156,3 +302,67 @@ class ExponentiallyDecayingReservoir(BaseReservoir):
     def _set_next_rescale(self):
         self._next_rescale = (datetime.now() +
                               ExponentiallyDecayingReservoir.RESCALE_THRESHOLD)
+
+
+class LogExponentiallyDecayingReservoir(BaseReservoir):
+    ''' A variant of :class:`ExponentiallyDecayingReservoir` that keeps the priorities
+    of its samples in log space, as ``alpha * t - log(u)`` instead of
+    ``exp(alpha * t) / u``.
+
+    The log priorities grow linearly with the age of the reservoir, so they never
+    overflow and the reservoir never has to rescale. Weights are made relative to
+    the most recent sample when a snapshot is taken, which yields the same normalized
+    weights as :class:`ExponentiallyDecayingReservoir` would. The samples are kept in
+    a heap, making an update O(log n).
+
+    :param rng: A :class:`random.Random` instance to draw from, a privately seeded
+                instance is created if it is omitted.
+    '''
+
+    DEFAULT_SIZE = 1028
+    DEFAULT_ALPHA = 0.015
+
+    def __init__(self, size=DEFAULT_SIZE, alpha=DEFAULT_ALPHA, rng=None):
+        super(LogExponentiallyDecayingReservoir, self).__init__()
+        self._size = size
+        self._alpha = alpha
+        self._rng = rng or Random()
+        self._landmark = datetime.now()
+
+    def update(self, value, timestamp=None):
+        timestamp = timestamp or datetime.now()
+
+        assert timestamp > self._landmark, 'Timestamp before landmark!'
+
+        log_weight = self._alpha * (timestamp - self._landmark).total_seconds()
+        priority = log_weight - log(_uniform(self._rng))
+        sample = (priority, value, log_weight)
+
+        if self._count < self._size:
+            heappush(self._res, sample)
+        elif self._res[0][0] < priority:
+            heapreplace(self._res, sample)
+
+        self._count += 1
+
+    def snapshot(self):
+        if not self._res:
+            return WeightedSnapshot([])
+        top = max(log_weight for _, _, log_weight in self._res)
+        return WeightedSnapshot((value, exp(log_weight - top))
+                                for _, value, log_weight in self._res)
+
+    def values(self):
+        return (value for _, value, _ in self._res)
+
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        ''' Summaries of weighted reservoirs are computed from a snapshot. '''
+        return self.snapshot().summary(quantiles)
+
+
+def _uniform(rng):
+    ''' Returns a random float in the open interval ``(0, 1)``. '''
+    u = rng.random()
+    while u == 0.0:
+        u = rng.random()
+    return u
@@ -3,9 +3,17 @@
 
 import math
 
+from bisect import bisect_right
+from heapq import nlargest, nsmallest
+from itertools import accumulate
+
 from .util import cached_property
 
 
+#: The quantiles :meth:`~caliper.reservoir.BaseReservoir.summary` computes by default.
+DEFAULT_QUANTILES = (0.5, 0.75, 0.95, 0.98, 0.99, 0.999)
+
+
 # XXX: Not sure if inheriting from tuple and overloading __new__ is a good idea.
 
 
@@ -13,6 +21,14 @@ class Snapshot(tuple):
     ''' A snapshot holds an immutable view over a reservoir, and offers some
     statistical measures about it's contents. Snapshots are iterable. '''
 
+    #: ``True`` if the snapshot holds a sample of the measured values beyond the
+    #: sampling of the reservoir, such as the snapshot of a sampling
+    #: :class:`~caliper.metric.Timer`.
+    sampled = False
+
+    #: The fraction of values that made it into the reservoir when :attr:`sampled`.
+    sample_rate = 1.0
+
     def __new__(cls, iterable):
         return tuple.__new__(cls, sorted(float(x) for x in iterable))
 
@@ -56,9 +72,16 @@ class Snapshot(tuple):
         variance = sum_ / float(len(self) - 1)
         return math.sqrt(variance)
 
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        ''' Returns a :class:`Summary` of the snapshot. '''
+        return _summary(self, quantiles)
+
 
 class WeightedSnapshot(tuple):
 
+    sampled = Snapshot.sampled
+    sample_rate = Snapshot.sample_rate
+
     def __new__(cls, iterable):
         iterable = list(iterable)
 
@@ -72,7 +95,8 @@ class WeightedSnapshot(tuple):
         sumweight = float(sum(weights))
         obj._normweights = [w / sumweight for w in weights]
 
-        obj._quantiles = [sum(obj._normweights[:i]) for i in range(len(values))]
+        # The cumulative weight of all values before each value.
+        obj._quantiles = [0.0] + list(accumulate(obj._normweights))[:-1] if values else []
 
         return obj
 
@@ -80,11 +104,7 @@ class WeightedSnapshot(tuple):
         if not 0 <= quantile <= 1:
             raise ValueError('Quantile should be in [0, 1].')
 
-        for pos, acc in enumerate(self._quantiles):
-            if acc > quantile:
-                break
-        else:
-            pos = len(self)
+        pos = bisect_right(self._quantiles, quantile)
 
         if pos <= 1:
             value = self[0]
@@ -105,3 +125,128 @@ class WeightedSnapshot(tuple):
             return 0
         variance = sum(w * (v - self.mean)**2 for v, w in zip(self, self._normweights))
         return math.sqrt(variance)
+
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        ''' Returns a :class:`Summary` of the snapshot. '''
+        return _summary(self, quantiles)
+
+
+class Summary(object):
+    ''' Selected quantiles and the moments of the values in a reservoir, computed
+    without sorting all of them. Created by
+    :meth:`~caliper.reservoir.BaseReservoir.summary`.
+
+    Quantiles are interpolated like :meth:`Snapshot.get_value` does, only the
+    quantiles the summary was created with are available.
+    '''
+
+    sampled = Snapshot.sampled
+    sample_rate = Snapshot.sample_rate
+
+    def __init__(self, size, quantiles, min, max, mean, stddev):
+        self.size = size
+        self.quantiles = quantiles
+        self.min = min
+        self.max = max
+        self.mean = mean
+        self.stddev = stddev
+
+    def __len__(self):
+        return self.size
+
+    def get_value(self, quantile):
+        ''' Returns the value at `quantile`, which must be one of the quantiles the
+        summary was created with. '''
+        try:
+            return self.quantiles[quantile]
+        except KeyError:
+            raise ValueError('Quantile %s is not in the summary.' % quantile)
+
+
+def _summary(snapshot, quantiles):
+    if len(snapshot) == 0:
+        return Summary(0, dict((q, 0) for q in quantiles), 0, 0, 0, 0)
+    return Summary(len(snapshot), dict((q, snapshot.get_value(q)) for q in quantiles),
+                   snapshot[0], snapshot[-1], snapshot.mean, snapshot.stddev)
+
+
+def summarize(values, quantiles, total=None, total_squares=None, shift=0.0):
+    ''' Returns a :class:`Summary` of the sequence `values`.
+
+    The values around tail quantiles are found with :func:`heapq.nsmallest` and
+    :func:`heapq.nlargest`, which is O(n log k) for the k values in the tails and
+    doesn't copy `values`. When the requested quantiles need more than a quarter of
+    the values, for instance the median, a sorted copy is cheaper and used instead.
+
+    :param total: The sum of `values` minus `shift`, if known.
+    :param total_squares: The sum of the squares of `values` minus `shift`, if known.
+    :param shift: A value close to `values`, which keeps the variance of large
+                  values accurate. The sums are computed in two passes if they
+                  aren't given.
+    '''
+    _check_quantiles(quantiles)
+    n = len(values)
+    if n == 0:
+        return Summary(0, dict((q, 0) for q in quantiles), 0, 0, 0, 0)
+
+    positions, ranks = _positions(quantiles, n)
+    at = _ranked(values, ranks, n)
+    result = dict((q, float(_interpolate(at, pos, index, n)))
+                  for q, (pos, index) in positions.items())
+    mean, stddev = _moments(values, n, total, total_squares, shift)
+    return Summary(n, result, float(at[0]), float(at[n - 1]), mean, stddev)
+
+
+def _check_quantiles(quantiles):
+    for q in quantiles:
+        if not 0 <= q <= 1:
+            raise ValueError('Quantile should be in [0, 1].')
+
+
+def _positions(quantiles, n):
+    ''' Returns a mapping of quantile to its ``(position, index)`` among `n` sorted
+    values and the set of ranks needed to interpolate all of them. '''
+    positions = {}
+    ranks = set([0, n - 1])
+    for q in quantiles:
+        pos = q * float(n + 1)
+        index = min(int(pos), n)
+        positions[q] = (pos, index)
+        if 0 < index < n:
+            ranks.update((index - 1, index))
+    return positions, ranks
+
+
+def _ranked(values, ranks, n):
+    ''' Returns a mapping of each rank in `ranks` to the value of that rank. '''
+    low = max(r for r in ranks if r < (n + 1) // 2) + 1
+    high = n - min((r for r in ranks if r >= (n + 1) // 2), default=n)
+    if low + high <= n // 4:
+        small = nsmallest(low, values)
+        large = nlargest(high, values)
+        return dict((r, small[r] if r < low else large[n - 1 - r]) for r in ranks)
+    ordered = sorted(values)
+    return dict((r, ordered[r]) for r in ranks)
+
+
+def _interpolate(at, pos, index, n):
+    if index == 0:
+        return at[0]
+    if index >= n:
+        return at[n - 1]
+    lower = at[index - 1]
+    return lower + (pos - index) * (at[index] - lower)
+
+
+def _moments(values, n, total, total_squares, shift):
+    ''' Returns the mean and standard deviation of `values`. '''
+    if total is None or total_squares is None:
+        shift = math.fsum(values) / n
+        total = math.fsum(x - shift for x in values)
+        total_squares = math.fsum((x - shift) * (x - shift) for x in values)
+
+    offset = total / float(n)
+    stddev = 0
+    if n > 1:
+        stddev = math.sqrt(max(0.0, (total_squares - total * offset) / (n - 1)))
+    return shift + offset, stddev
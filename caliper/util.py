@@ -1,3 +1,43 @@
 
-def cached_property(func):
-    return property(func)
+class cached_property(object):
+    ''' A property that is computed once per instance and then stored in the
+    instance's ``__dict__``, which shadows the property on later lookups. '''
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+        self.__name__ = func.__name__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        value = obj.__dict__[self.__name__] = self.func(obj)
+        return value
+
+
+_IDENTIFIER_START = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+_IDENTIFIER_PART = _IDENTIFIER_START | frozenset('0123456789')
+
+
+def is_identifier(s):
+    ''' Returns ``True`` if `s` is an ASCII identifier, ``[a-zA-Z_][a-zA-Z0-9_]*``.
+
+    This avoids importing :mod:`re` at startup.
+    '''
+    return bool(s) and s[0] in _IDENTIFIER_START and _IDENTIFIER_PART.issuperset(s)
+
+
+def column_name(quantile):
+    ''' Returns ``'p99'`` for 0.99, ``'p50'`` for 0.5 and ``'p999'`` for 0.999,
+    ``'p0'`` for 0 and ``'p100'`` for 1. '''
+    quantile = float(quantile)
+    if not 0 <= quantile <= 1:
+        raise ValueError('Quantile should be in [0, 1].')
+    if quantile in (0, 1):
+        return 'p%d' % (quantile * 100)
+    text = repr(quantile)
+    if 'e' in text:
+        # 1e-05 and smaller are written in scientific notation.
+        mantissa, exponent = text.split('e')
+        text = '0.' + '0' * (-int(exponent) - 1) + mantissa.replace('.', '')
+    return 'p' + text[2:].ljust(2, '0')
@@ -0,0 +1,24 @@
+''' Functions timed by the tests of :mod:`caliper.instrument`. '''
+
+
+def add(a, b):
+    return a + b
+
+
+def fail():
+    raise ValueError()
+
+
+def outer():
+    return add(1, 2) + add(3, 4)
+
+
+def numbers():
+    yield 1
+    yield 2
+
+
+class Thing(object):
+
+    def method(self):
+        return add(1, 1)
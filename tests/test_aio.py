@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase
+
+from caliper.aio import collect_gauges
+from caliper.labels import NO_LABELS
+from caliper.metric import Gauge
+from caliper.registry import Registry
+
+
+class TestCollectGauges(TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def collect(self, **kwargs):
+        return asyncio.run(collect_gauges(self.registry, **kwargs))
+
+    def test_collects_plain_gauges(self):
+        self.registry.get_or_create_metric(Gauge, 'a').value = 42
+        self.assertEqual(self.collect(), {(('a', 'Gauge'), NO_LABELS): 42})
+
+    def test_collects_coroutine_gauges(self):
+        async def get_value():
+            await asyncio.sleep(0.01)
+            return 42
+        self.registry.get_or_create_metric(Gauge, 'a').get_value = get_value
+        self.assertEqual(self.collect(), {(('a', 'Gauge'), NO_LABELS): 42})
+
+    def test_collects_blocking_gauges(self):
+        self.registry.get_or_create_metric(Gauge, 'a').get_value = lambda: 42
+        self.assertEqual(self.collect(), {(('a', 'Gauge'), NO_LABELS): 42})
+
+    def test_slow_gauge_times_out(self):
+        async def slow():
+            await asyncio.sleep(1)
+        self.registry.get_or_create_metric(Gauge, 'slow').get_value = slow
+        self.registry.get_or_create_metric(Gauge, 'fast').get_value = lambda: 2
+
+        started = time.time()
+        values = self.collect(timeout=0.05, default=-1)
+        self.assertLess(time.time() - started, 0.5)
+        self.assertEqual(values, {(('slow', 'Gauge'), NO_LABELS): -1, (('fast', 'Gauge'), NO_LABELS): 2})
+
+    def test_stuck_gauge_runs_once(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def stuck():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.3)
+            with lock:
+                running[0] -= 1
+            return 42
+        self.registry.get_or_create_metric(Gauge, 'stuck').get_value = stuck
+
+        async def collect():
+            return [await collect_gauges(self.registry, timeout=0.05, default=-1)
+                    for _ in range(5)]
+
+        key = (('stuck', 'Gauge'), NO_LABELS)
+        self.assertEqual(asyncio.run(collect()), [{key: -1}] * 5)
+        self.assertEqual(running[1], 1)
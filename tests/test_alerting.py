@@ -0,0 +1,179 @@
+from unittest import TestCase
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from caliper.alerting import (
+    FIRING, RESOLVED, AlertEngine, BurnRateRule, RateOfChangeRule, ThresholdRule)
+from caliper.labels import labelset
+from caliper.metric import Counter, Gauge, Timer
+from caliper.registry import Registry
+from caliper.reservoir import SlidingWindowReservoir
+
+
+class TestAlertEngine(TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.events = []
+        self.engine = AlertEngine(self.registry, self.events.append)
+
+    def timer(self, **labels):
+        return self.registry.get_or_create_metric(Timer, 'db.query',
+                                                  SlidingWindowReservoir(10), **labels)
+
+    def test_threshold_fires_and_resolves(self):
+        rule = self.engine.add(ThresholdRule('slow', Timer, 'db.query', 'p99', '>', 0.2))
+        timer = self.timer()
+        timer.update(0.1)
+        self.assertEqual(self.engine.evaluate(now=1), [])
+
+        timer.update(0.5)
+        events = self.engine.evaluate(now=2)
+        self.assertEqual([(e.rule, e.state, e.value) for e in events],
+                         [(rule, FIRING, 0.5)])
+        self.assertEqual(self.events, events)
+        self.assertEqual(self.engine.firing(), [(rule, labelset({}))])
+
+        self.assertEqual(self.engine.evaluate(now=3), [])
+        for _ in range(10):
+            timer.update(0.1)
+        self.assertEqual([e.state for e in self.engine.evaluate(now=4)], [RESOLVED])
+        self.assertEqual(self.engine.firing(), [])
+
+    def test_for_intervals(self):
+        self.engine.add(ThresholdRule('slow', Timer, 'db.query', 'max', '>', 0.2,
+                                      for_intervals=3))
+        self.timer().update(0.5)
+        self.assertEqual(self.engine.evaluate(now=1), [])
+        self.assertEqual(self.engine.evaluate(now=2), [])
+        self.assertEqual([e.state for e in self.engine.evaluate(now=3)], [FIRING])
+        self.assertEqual(self.engine.evaluate(now=4), [])
+
+    def test_evaluates_each_label_set(self):
+        self.engine.add(ThresholdRule('slow', Timer, 'db.query', 'max', '>', 0.2))
+        self.timer(table='users').update(0.5)
+        self.timer(table='groups').update(0.1)
+        events = self.engine.evaluate(now=1)
+        self.assertEqual([e.labels for e in events], [labelset({'table': 'users'})])
+
+    def test_label_filter(self):
+        self.engine.add(ThresholdRule('slow', Timer, 'db.query', 'max', '>', 0.2,
+                                      labels={'table': 'groups'}))
+        self.timer(table='users').update(0.5)
+        self.assertEqual(self.engine.evaluate(now=1), [])
+
+    def test_snapshots_each_metric_once(self):
+        for q in ('p50', 'p99', 'p999'):
+            self.engine.add(ThresholdRule(q, Timer, 'db.query', q, '>', 0.2))
+        timer = self.timer()
+        timer.update(0.5)
+        with patch.object(Timer, 'snapshot', autospec=True,
+                          side_effect=Timer.snapshot) as snapshot:
+            self.assertEqual(len(self.engine.evaluate(now=1)), 3)
+        self.assertEqual(snapshot.call_count, 1)
+
+    def test_only_looks_up_metrics_with_rules(self):
+        self.engine.add(ThresholdRule('slow', Timer, 'db.query', 'max', '>', 0.2))
+        for i in range(10):
+            self.registry.get_or_create_metric(Counter, 'other%d' % i)
+        with patch.object(self.registry, 'family', wraps=self.registry.family) as family:
+            self.engine.evaluate(now=1)
+        family.assert_called_once_with(Timer, 'db.query')
+
+    def test_resolves_alerts_of_evicted_metrics(self):
+        self.engine.add(ThresholdRule('slow', Timer, 'db.query', 'max', '>', 0.2))
+        self.timer().update(0.5)
+        self.engine.evaluate(now=1)
+        self.registry._evict(list(self.registry._metrics))
+        events = self.engine.evaluate(now=2)
+        self.assertEqual([(e.state, e.value) for e in events], [(RESOLVED, None)])
+
+    def test_remove(self):
+        rule = self.engine.add(ThresholdRule('slow', Timer, 'db.query', 'max', '>', 0.2))
+        self.timer().update(0.5)
+        self.engine.evaluate(now=1)
+        self.engine.remove(rule)
+        self.assertEqual(self.engine.rules(), [])
+        self.assertEqual(self.engine.firing(), [])
+        self.assertEqual(self.engine.evaluate(now=2), [])
+
+    def test_callable_stat(self):
+        self.engine.add(ThresholdRule('low', Gauge, 'free', lambda g: g.value * 2, '<', 10))
+        self.registry.get_or_create_metric(Gauge, 'free').value = 4
+        self.assertEqual([e.value for e in self.engine.evaluate(now=1)], [8])
+
+    def test_quantile_stat(self):
+        self.assertEqual(ThresholdRule('low', Timer, 'db.query', 'p05', '<', 1).stat, 0.05)
+        self.assertEqual(ThresholdRule('low', Timer, 'db.query', 'p50', '<', 1).stat, 0.5)
+        self.assertEqual(ThresholdRule('max', Timer, 'db.query', 'p100', '<', 1).stat, 1)
+        self.assertEqual(ThresholdRule('min', Timer, 'db.query', 'p0', '<', 1).stat, 0)
+        self.assertEqual(ThresholdRule('low', Timer, 'db.query', 'p10', '<', 1).stat, 0.1)
+        for stat in ('p5', 'p1', 'p500', 'p990', 'p1000'):
+            with self.assertRaises(ValueError):
+                ThresholdRule('low', Timer, 'db.query', stat, '<', 1)
+
+    def test_unknown_operator(self):
+        with self.assertRaises(ValueError):
+            ThresholdRule('slow', Timer, 'db.query', 'max', '==', 0.2)
+
+
+class TestRateOfChangeRule(TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.engine = AlertEngine(self.registry)
+        self.engine.add(RateOfChangeRule('errors', Counter, 'errors', 'count', '>', 5))
+        self.counter = self.registry.get_or_create_metric(Counter, 'errors')
+
+    def test_fires_on_rate(self):
+        self.counter.inc(100)
+        self.assertEqual(self.engine.evaluate(now=10), [])
+        self.counter.inc(40)
+        self.assertEqual(self.engine.evaluate(now=20), [])
+        self.counter.inc(60)
+        events = self.engine.evaluate(now=30)
+        self.assertEqual([(e.state, e.value) for e in events], [(FIRING, 6)])
+        self.assertEqual([e.state for e in self.engine.evaluate(now=40)], [RESOLVED])
+
+
+class TestBurnRateRule(TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.engine = AlertEngine(self.registry)
+        self.engine.add(BurnRateRule('budget', Counter, 'errors', 'requests',
+                                     objective=0.99, factor=10, long_window=100,
+                                     short_window=20))
+        self.errors = self.registry.get_or_create_metric(Counter, 'errors')
+        self.requests = self.registry.get_or_create_metric(Counter, 'requests')
+
+    def step(self, now, requests, errors):
+        self.requests.inc(requests)
+        self.errors.inc(errors)
+        return [(e.state, round(e.value, 6)) for e in self.engine.evaluate(now=now)]
+
+    def test_fires_when_both_windows_burn(self):
+        self.assertEqual(self.step(0, 0, 0), [])
+        for now in range(10, 100, 10):
+            self.assertEqual(self.step(now, 100, 0), [])
+        # A short burst burns the short window, but not yet the long one.
+        self.assertEqual(self.step(100, 100, 50), [])
+        self.assertEqual(self.step(110, 100, 50), [])
+        self.assertEqual(self.step(120, 100, 50), [(FIRING, 15.0)])
+
+    def test_resolves_when_short_window_recovers(self):
+        for now in range(0, 110, 10):
+            self.step(now, 100, 20)
+        self.assertEqual(self.engine.firing()[0][0].name, 'budget')
+        # The long window still burns, the short one no longer does.
+        events = self.step(110, 100, 0) + self.step(120, 100, 0)
+        self.assertEqual([state for state, _ in events], [RESOLVED])
+        self.assertEqual(self.engine.firing(), [])
+
+    def test_missing_error_metric_counts_as_zero(self):
+        engine = AlertEngine(self.registry)
+        engine.add(BurnRateRule('budget', Counter, 'failures', 'requests', factor=1))
+        self.requests.inc(10)
+        self.assertEqual(engine.evaluate(now=1), [])
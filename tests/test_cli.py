@@ -0,0 +1,142 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+from caliper.cli import ALL, Options, analyze, main, read_shard, shards
+from caliper.util import column_name
+
+
+LINES = [
+    'GET /users 10',
+    'GET /groups 20',
+    'GET /users 30',
+    '',
+    'GET /users oops',
+    'GET /groups 40',
+    'GET /users 50',
+]
+
+
+class TestCli(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.log = self.write('access.log', '\n'.join(LINES) + '\n')
+        self.options = Options(1, -1, None, 1.0, 100, 'seed')
+
+    def write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def run_main(self, *args):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = main(list(args))
+        return code, out.getvalue()
+
+    def test_shards_cover_every_line_once(self):
+        content = b''.join(b''.join(read_shard(*shard)) for shard in shards([self.log], 7))
+        with open(self.log, 'rb') as f:
+            self.assertEqual(content, f.read())
+
+    def test_shard_boundary_on_line_start(self):
+        first = len(LINES[0]) + 1
+        self.assertEqual(list(read_shard(self.log, 0, first)), [b'GET /users 10\n'])
+        self.assertEqual(list(read_shard(self.log, first, first + 1)),
+                         [b'GET /groups 20\n'])
+
+    def test_shard_chunks_end_on_line_boundaries(self):
+        size = os.path.getsize(self.log)
+        chunks = list(read_shard(self.log, 0, size, chunk_size=20))
+        self.assertEqual(chunks, [b'GET /users 10\nGET /groups 20\n',
+                                  b'GET /users 30\n\nGET /users oops\n',
+                                  b'GET /groups 40\nGET /users 50\n'])
+        self.assertEqual(list(read_shard(self.log, 0, size, chunk_size=1)),
+                         [line.encode() + b'\n' for line in LINES])
+
+    def test_file_without_trailing_newline(self):
+        path = self.write('short.log', 'a 1\nb 2')
+        content = b''.join(b''.join(read_shard(*shard)) for shard in shards([path], 3))
+        self.assertEqual(content, b'a 1\nb 2')
+
+    def test_analyze(self):
+        histograms, skipped = analyze([self.log], self.options, jobs=1, shard_size=10)
+        self.assertEqual(skipped, 1)
+        self.assertEqual(sorted(histograms), ['/groups', '/users'])
+        users = histograms['/users']
+        self.assertEqual(users.count, 3)
+        self.assertEqual((users.min, users.max, users.mean), (10, 50, 30))
+        self.assertEqual(sorted(users.snapshot()), [10, 30, 50])
+
+    def test_analyze_in_processes(self):
+        expected, _ = analyze([self.log], self.options, jobs=1, shard_size=10)
+        histograms, skipped = analyze([self.log, self.log], self.options, jobs=2,
+                                      shard_size=10)
+        self.assertEqual(skipped, 2)
+        for key, histogram in expected.items():
+            self.assertEqual(histograms[key].count, 2 * histogram.count)
+            self.assertEqual(histograms[key].mean, histogram.mean)
+
+    def test_without_key_column(self):
+        options = self.options._replace(key=None, scale=0.001)
+        histograms, _ = analyze([self.log], options, jobs=1)
+        self.assertEqual(list(histograms), [ALL])
+        self.assertAlmostEqual(histograms[ALL].sum, 0.15)
+
+    def test_delimiter(self):
+        path = self.write('data.csv', 'a,1\nb,2\na,3\n')
+        code, out = self.run_main(path, '-k', '1', '-v', '2', '-d', ',', '-q', '0.5')
+        self.assertEqual(code, 0)
+        self.assertEqual(out.split('\n')[1].split(), ['a', '2', '2', '1', '2', '3'])
+
+    def test_table(self):
+        code, out = self.run_main(self.log, '-k', '2', '-v', '3', '--sort', 'max')
+        self.assertEqual(code, 0)
+        lines = out.splitlines()
+        self.assertEqual(lines[0].split(), ['key', 'count', 'mean', 'min', 'p50', 'p90',
+                                            'p99', 'p999', 'max'])
+        self.assertEqual([line.split()[0] for line in lines[1:3]], ['/users', '/groups'])
+        self.assertIn('1 line(s) could not be parsed', out)
+
+    def test_extreme_quantiles(self):
+        code, out = self.run_main(self.log, '-k', '2', '-v', '3', '-q', '0,1e-05,1')
+        self.assertEqual(code, 0)
+        lines = out.splitlines()
+        self.assertEqual(lines[0].split(), ['key', 'count', 'mean', 'min', 'p0',
+                                            'p00001', 'p100', 'max'])
+        self.assertEqual(lines[2].split()[4:], ['10', '10', '50', '50'])
+
+    def test_column_names(self):
+        names = [column_name(q) for q in (0, 0.05, 0.5, 0.99, 0.999, 1.5e-05, 1)]
+        self.assertEqual(names, ['p0', 'p05', 'p50', 'p99', 'p999', 'p000015', 'p100'])
+        for quantile in (-0.1, 1.5):
+            with self.assertRaises(ValueError):
+                column_name(quantile)
+
+    def test_json_and_compare(self):
+        baseline = os.path.join(self.dir, 'baseline.json')
+        code, _ = self.run_main(self.log, '-k', '2', '-v', '3', '--json', baseline)
+        self.assertEqual(code, 0)
+        with open(baseline) as f:
+            document = json.load(f)
+        self.assertEqual(document['results']['/users']['count'], 3)
+        self.assertEqual(document['skipped'], 1)
+
+        code, out = self.run_main(self.log, '-k', '2', '-v', '3', '--compare', baseline)
+        self.assertEqual(code, 0)
+        self.assertNotIn('REGRESSION', out)
+
+        code, out = self.run_main(self.log, '-k', '2', '-v', '3', '-s', '2',
+                                  '--compare', baseline)
+        self.assertEqual(code, 1)
+        self.assertIn('REGRESSION', out)
+
+    def test_invalid_sort(self):
+        self.assertEqual(self.run_main(self.log, '-v', '3', '--sort', 'nope')[0], 2)
@@ -0,0 +1,136 @@
+from unittest import TestCase
+
+from caliper.history import History
+from caliper.metric import Counter, Gauge, Histogram, Timer
+from caliper.registry import Registry
+from caliper.reservoir import SlidingWindowReservoir
+
+
+class TestHistory(TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.history = History(self.registry, resolutions=((10, 6), (60, 3)),
+                               quantiles=(0.5, 0.99))
+
+    def test_columns(self):
+        self.registry.get_or_create_metric(Timer, 'db.query')
+        self.registry.get_or_create_metric(Counter, 'requests')
+        self.registry.get_or_create_metric(Gauge, 'free').value = 1
+        self.history.record(now=0)
+        self.assertEqual(self.history.columns(Timer, 'db.query'),
+                         ('count', 'mean', 'min', 'max', 'p50', 'p99'))
+        self.assertEqual(self.history.columns(Counter, 'requests'), ('count',))
+        self.assertEqual(self.history.columns(Gauge, 'free'), ('value',))
+
+    def test_consolidates_into_buckets(self):
+        gauge = self.registry.get_or_create_metric(Gauge, 'free')
+        for now, value in ((0, 1), (5, 3), (10, 10), (25, 4), (30, 0)):
+            gauge.value = value
+            self.history.record(now=now)
+        times, values = self.history.query(Gauge, 'free', 'value', 0)
+        self.assertEqual(list(times), [0, 10, 20])
+        self.assertEqual(list(values), [2, 10, 4])
+
+    def test_rolls_up(self):
+        histogram = self.registry.get_or_create_metric(Histogram, 'size',
+                                                       SlidingWindowReservoir(1))
+        # A minute is completed when the first 10 second bucket after it is.
+        for now in range(0, 140, 10):
+            histogram.update(now)
+            self.history.record(now=now)
+        times, maxima = self.history.query(Histogram, 'size', 'max', 0, resolution=60)
+        self.assertEqual(list(times), [0, 60])
+        self.assertEqual(list(maxima), [50, 110])
+        # Means, minimums and maximums are those of each interval, not since the
+        # histogram was created.
+        _, means = self.history.query(Histogram, 'size', 'mean', 0, resolution=60)
+        self.assertEqual(list(means), [25, 85])
+        _, minima = self.history.query(Histogram, 'size', 'min', 0, resolution=60)
+        self.assertEqual(list(minima), [0, 60])
+        _, counts = self.history.query(Histogram, 'size', 'count', 0, resolution=60)
+        self.assertEqual(list(counts), [6, 12])
+
+    def test_interval_mean(self):
+        timer = self.registry.get_or_create_metric(Timer, 'db.query')
+        for now, durations in ((0, [1, 3]), (10, []), (20, [10]), (25, [20, 30])):
+            for duration in durations:
+                timer.update(duration)
+            self.history.record(now=now)
+        self.history.record(now=30)
+        _, means = self.history.query(Timer, 'db.query', 'mean', 0)
+        self.assertEqual(means[0], 2)
+        self.assertNotEqual(means[1], means[1])
+        self.assertEqual(means[2], 17.5)
+
+    def test_labels_named_like_parameters(self):
+        self.registry.get_or_create_metric(Counter, 'requests', name='users').inc()
+        self.history.record(now=0)
+        self.history.record(now=10)
+        self.assertEqual(self.history.columns(Counter, 'requests', name='users'),
+                         ('count',))
+        _, counts = self.history.query(Counter, 'requests', 'count', 0, name='users')
+        self.assertEqual(list(counts), [1])
+
+    def test_range(self):
+        counter = self.registry.get_or_create_metric(Counter, 'requests')
+        for now in range(0, 60, 10):
+            counter.inc()
+            self.history.record(now=now)
+        times, counts = self.history.query(Counter, 'requests', 'count', 15, 30)
+        self.assertEqual(list(times), [10, 20, 30])
+        self.assertEqual(list(counts), [2, 3, 4])
+
+    def test_ring_wraps_and_falls_back_to_coarser_resolution(self):
+        counter = self.registry.get_or_create_metric(Counter, 'requests')
+        for now in range(0, 200, 10):
+            counter.inc()
+            self.history.record(now=now)
+        # The finest resolution only keeps the last 6 completed buckets.
+        times, counts = self.history.query(Counter, 'requests', 'count', 130)
+        self.assertEqual(list(times), [130, 140, 150, 160, 170, 180])
+        self.assertEqual(list(counts), [14, 15, 16, 17, 18, 19])
+        times, counts = self.history.query(Counter, 'requests', 'count', 5)
+        self.assertEqual(list(times), [0, 60, 120])
+        self.assertEqual(list(counts), [6, 12, 18])
+
+    def test_memory_is_bounded(self):
+        counter = self.registry.get_or_create_metric(Counter, 'requests')
+        self.history.record(now=0)
+        rings = list(self.history._series.values())[0]._rings
+        sizes = [len(ring._times) for ring in rings]
+        for now in range(0, 10000, 10):
+            counter.inc()
+            self.history.record(now=now)
+        self.assertEqual(sizes, [6, 3])
+        self.assertEqual([len(ring._times) for ring in rings], sizes)
+
+    def test_drops_metrics_that_left_the_registry(self):
+        self.registry.get_or_create_metric(Counter, 'requests')
+        self.history.record(now=0)
+        self.registry._evict(list(self.registry._metrics))
+        self.history.record(now=10)
+        with self.assertRaises(KeyError):
+            self.history.columns(Counter, 'requests')
+
+    def test_gauge_values(self):
+        gauge = self.registry.get_or_create_metric(Gauge, 'free')
+        ident = self.registry.items()[0][:2]
+        self.history.record(now=0, gauge_values={ident: 7})
+        self.history.record(now=10, gauge_values={ident: 'n/a'})
+        self.history.record(now=20, gauge_values={})
+        _, values = self.history.query(Gauge, 'free', 'value', 0)
+        self.assertEqual(values[0], 7)
+        self.assertNotEqual(values[1], values[1])
+
+    def test_unknown_column(self):
+        self.registry.get_or_create_metric(Counter, 'requests')
+        self.history.record(now=0)
+        with self.assertRaises(ValueError):
+            self.history.query(Counter, 'requests', 'p99', 0)
+
+    def test_unknown_resolution(self):
+        self.registry.get_or_create_metric(Counter, 'requests')
+        self.history.record(now=0)
+        with self.assertRaises(ValueError):
+            self.history.query(Counter, 'requests', 'count', 0, resolution=5)
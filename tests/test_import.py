@@ -0,0 +1,69 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+import caliper
+
+
+# Budget for the cumulative import time of ``caliper`` including the parts of the
+# standard library it needs, in microseconds. Currently about 15ms.
+IMPORT_BUDGET = 50000
+
+LAZY_MODULES = ['array', 'asyncio', 'caliper.aio', 'caliper.alerting', 'caliper.cli',
+                'caliper.history', 'caliper.instrument', 'concurrent.futures', 'mmap']
+
+
+def run(code, env=None):
+    return subprocess.check_output([sys.executable, '-X', 'importtime', '-c', code],
+                                   stderr=subprocess.STDOUT, env=env).decode()
+
+
+def import_time(output):
+    ''' Cumulative microseconds spent importing ``caliper`` according to
+    ``python -X importtime``. '''
+    for line in output.splitlines():
+        fields = [f.strip() for f in line.split('|')]
+        if len(fields) == 3 and fields[2] == 'caliper':
+            return int(fields[1])
+    raise AssertionError('caliper not found in:\n%s' % output)
+
+
+class TestImport(TestCase):
+
+    def test_import_time(self):
+        # Measure with bytecode caches, written to a temporary directory.
+        cache = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache)
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=cache)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+        run('import caliper', env)
+        best = min(import_time(run('import caliper', env)) for _ in range(3))
+        self.assertLess(best, IMPORT_BUDGET)
+
+    def test_optional_subsystems_are_not_imported(self):
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, caliper; print(" ".join(sorted(sys.modules)))',
+        ]).decode().split()
+        for name in LAZY_MODULES:
+            self.assertNotIn(name, output)
+        self.assertNotIn('re', output)
+
+    def test_lazy_module(self):
+        from caliper import instrument
+        self.assertIs(caliper.instrument, instrument)
+
+    def test_lazy_attribute(self):
+        from caliper.instrument import Instrumenter
+        self.assertIs(caliper.Instrumenter, Instrumenter)
+
+    def test_unknown_attribute(self):
+        with self.assertRaises(AttributeError):
+            caliper.does_not_exist
+
+    def test_dir_lists_lazy_names(self):
+        self.assertIn('instrument', dir(caliper))
@@ -0,0 +1,123 @@
+import threading
+
+from unittest import TestCase
+
+from caliper.instrument import Instrumenter
+from caliper.metric import Timer
+from caliper.reservoir import Reservoir
+from caliper.registry import Registry
+
+from tests import instrumented
+
+
+class TestInstrumenter(TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def instrument(self, **kwargs):
+        return Instrumenter(['tests.instrumented'], registry=self.registry, **kwargs)
+
+    def timers(self):
+        return dict(('.'.join(key[:-1]), metric) for key, _, metric in self.registry.items()
+                    if isinstance(metric, Timer))
+
+    def test_times_calls(self):
+        with self.instrument():
+            instrumented.add(1, 2)
+            instrumented.add(1, 2)
+
+        timer = self.timers()['tests.instrumented.add']
+        self.assertEqual(timer.count, 2)
+
+    def test_does_not_time_after_stop(self):
+        with self.instrument():
+            instrumented.add(1, 2)
+        instrumented.add(1, 2)
+        self.assertEqual(self.timers()['tests.instrumented.add'].count, 1)
+
+    def test_times_nested_calls(self):
+        with self.instrument():
+            instrumented.outer()
+
+        timers = self.timers()
+        self.assertEqual(timers['tests.instrumented.outer'].count, 1)
+        self.assertEqual(timers['tests.instrumented.add'].count, 2)
+
+    def test_times_methods(self):
+        with self.instrument():
+            instrumented.Thing().method()
+        self.assertEqual(self.timers()['tests.instrumented.Thing.method'].count, 1)
+
+    def test_times_calls_that_raise(self):
+        with self.instrument():
+            with self.assertRaises(ValueError):
+                instrumented.fail()
+            instrumented.add(1, 2)
+
+        timers = self.timers()
+        self.assertEqual(timers['tests.instrumented.fail'].count, 1)
+        self.assertEqual(timers['tests.instrumented.add'].count, 1)
+
+    def test_ignores_other_modules(self):
+        with self.instrument():
+            Reservoir().update(1)
+        self.assertEqual(list(self.timers()), [])
+
+    def test_ignores_generators(self):
+        with self.instrument():
+            list(instrumented.numbers())
+        self.assertEqual(list(self.timers()), [])
+
+    def test_qualnames(self):
+        with self.instrument(qualnames=['*.outer']):
+            instrumented.outer()
+        self.assertEqual(list(self.timers()), ['tests.instrumented.outer'])
+
+    def test_exclude(self):
+        with self.instrument(exclude=['*.add']):
+            instrumented.outer()
+        self.assertEqual(list(self.timers()), ['tests.instrumented.outer'])
+
+    def test_sample_every(self):
+        with self.instrument(sample_every=5):
+            for _ in range(20):
+                instrumented.add(1, 2)
+        timer = self.timers()['tests.instrumented.add']
+        self.assertEqual(timer.count, 20)
+        self.assertEqual(len(timer.snapshot()), 4)
+        self.assertTrue(timer.snapshot().sampled)
+
+    def test_does_not_time_threads_after_stop(self):
+        started, stopped = threading.Event(), threading.Event()
+
+        def run():
+            started.set()
+            stopped.wait()
+            for _ in range(10):
+                instrumented.add(1, 2)
+
+        with self.instrument():
+            thread = threading.Thread(target=run)
+            thread.start()
+            started.wait()
+        stopped.set()
+        thread.join()
+        self.assertEqual(list(self.timers()), [])
+
+    def test_cannot_start_twice(self):
+        instrumenter = self.instrument()
+        with instrumenter:
+            with self.assertRaises(RuntimeError):
+                instrumenter.start()
+
+    def test_name(self):
+        instrumenter = self.instrument()
+        self.assertEqual(instrumenter.name('a.b', instrumented.Thing.method.__code__),
+                         'a.b.Thing.method')
+
+    def test_selects_submodules(self):
+        instrumenter = Instrumenter(['a.b'])
+        self.assertTrue(instrumenter.selects('a.b', 'a.b.f'))
+        self.assertTrue(instrumenter.selects('a.b.c', 'a.b.c.f'))
+        self.assertFalse(instrumenter.selects('a.bc', 'a.bc.f'))
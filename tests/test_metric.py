@@ -1,4 +1,8 @@
 
+import asyncio
+import contextvars
+import threading
+import weakref
 from datetime import datetime, timedelta
 from unittest import TestCase
 try:
@@ -6,7 +10,9 @@ try:
 except ImportError:
     from mock import Mock, patch
 
-from caliper.metric import EWMA, Counter, Meter, Gauge
+from caliper.metric import (
+    EWMA, Counter, Meter, Gauge, CachedGauge, DerivedGauge, RatioGauge, Histogram, Timer)
+from caliper.reservoir import Reservoir, SlidingWindowReservoir
 
 
 class TestCounter(TestCase):
@@ -137,6 +143,252 @@ class TestMeter(TestCase):
         self.assertEqual(self.meter.m15rate.tick.call_count, 2)
 
 
+class TestHistogram(TestCase):
+
+    def test_running_statistics(self):
+        histogram = Histogram(SlidingWindowReservoir(2))
+        for value in (3, 1, 4, 1, 5):
+            histogram.update(value)
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.sum, 14)
+        self.assertEqual(histogram.min, 1)
+        self.assertEqual(histogram.max, 5)
+        self.assertAlmostEqual(histogram.mean, 2.8)
+        self.assertAlmostEqual(histogram.variance, 3.2)
+        self.assertAlmostEqual(histogram.stddev, 3.2 ** 0.5)
+        self.assertEqual(len(histogram.snapshot()), 2)
+
+    def test_matches_snapshot(self):
+        histogram = Histogram(Reservoir())
+        for value in (1e9 + 4, 1e9 + 7, 1e9 + 13, 1e9 + 16):
+            histogram.update(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(histogram.min, snapshot[0])
+        self.assertEqual(histogram.max, snapshot[-1])
+        self.assertAlmostEqual(histogram.mean, snapshot.mean)
+        self.assertAlmostEqual(histogram.variance, 30)
+
+    def test_merge(self):
+        values = [3, 1, 4, 1, 5, 9, 2, 6]
+        merged, other, expected = Histogram(Reservoir()), Histogram(Reservoir()), \
+            Histogram(Reservoir())
+        for value in values[:3]:
+            merged.update(value)
+        for value in values[3:]:
+            other.update(value)
+        for value in values:
+            expected.update(value)
+        merged.merge(other)
+        self.assertEqual(merged.count, 8)
+        self.assertEqual(sorted(merged.snapshot()), sorted(values))
+        self.assertEqual((merged.sum, merged.min, merged.max), (31, 1, 9))
+        self.assertAlmostEqual(merged.mean, expected.mean)
+        self.assertAlmostEqual(merged.variance, expected.variance)
+
+    def test_merge_empty(self):
+        histogram, empty = Histogram(Reservoir()), Histogram(Reservoir())
+        empty.merge(histogram)
+        self.assertEqual((empty.count, empty.min, empty.max, empty.mean), (0, 0, 0, 0))
+        histogram.update(5)
+        empty.merge(histogram)
+        self.assertEqual((empty.count, empty.min, empty.max, empty.mean), (1, 5, 5, 5))
+
+    def test_empty(self):
+        histogram = Histogram(Reservoir())
+        self.assertEqual((histogram.sum, histogram.min, histogram.max), (0, 0, 0))
+        self.assertEqual((histogram.mean, histogram.stddev), (0, 0))
+        histogram.update(2)
+        self.assertEqual((histogram.min, histogram.max, histogram.mean), (2, 2, 2))
+        self.assertEqual(histogram.stddev, 0)
+
+
+class TestTimer(TestCase):
+
+    def setUp(self):
+        self.timer = Timer(Reservoir())
+
+    def test_time_records_duration(self):
+        with self.timer.time():
+            pass
+        self.assertEqual(self.timer.count, 1)
+        self.assertEqual(len(self.timer.snapshot()), 1)
+
+    def test_abort(self):
+        with self.timer.time() as context:
+            context.abort()
+        self.assertEqual(self.timer.count, 0)
+
+    def test_does_not_update_on_failure(self):
+        with self.assertRaises(ZeroDivisionError):
+            with self.timer.time(update_on_failure=False):
+                1 / 0
+        self.assertEqual(self.timer.count, 0)
+
+    def test_update_ignores_non_positive_durations(self):
+        self.timer.update(0)
+        self.assertEqual(self.timer.count, 0)
+
+    def test_running_statistics(self):
+        for duration in (0.2, 0.1, 0.3):
+            self.timer.update(duration)
+        self.assertAlmostEqual(self.timer.sum, 0.6)
+        self.assertEqual(self.timer.min, 0.1)
+        self.assertEqual(self.timer.max, 0.3)
+        self.assertAlmostEqual(self.timer.mean, 0.2)
+        self.assertAlmostEqual(self.timer.stddev, 0.1)
+
+    def test_updates_its_reservoir(self):
+        reservoir = Reservoir()
+        timer = Timer(reservoir)
+        timer.update(0.5)
+        self.assertEqual(list(reservoir.values()), [0.5])
+        self.assertEqual(timer.snapshot(), (0.5,))
+
+    def test_has_slots(self):
+        self.assertFalse(hasattr(self.timer, '__dict__'))
+        self.assertIs(weakref.ref(self.timer)(), self.timer)
+
+    def test_snapshot_is_not_sampled(self):
+        self.timer.update(1)
+        snapshot = self.timer.snapshot()
+        self.assertFalse(snapshot.sampled)
+        self.assertEqual(snapshot.sample_rate, 1.0)
+
+
+class TestSpanTimer(TestCase):
+
+    def setUp(self):
+        self.parent = Timer(Reservoir(), spans=Reservoir())
+        self.child = Timer(Reservoir(), spans=Reservoir())
+
+    def clock(self, *times):
+        return patch('caliper.metric.default_timer', Mock(side_effect=times))
+
+    def test_records_inclusive_and_exclusive(self):
+        with self.clock(0, 1, 3, 4, 7, 10):
+            with self.parent.time():
+                with self.child.time():
+                    pass
+                with self.child.time():
+                    pass
+        self.assertEqual(self.parent.snapshot(), (10,))
+        self.assertEqual(self.parent.exclusive.snapshot(), (5,))
+        self.assertEqual(self.child.snapshot(), (2, 3))
+        self.assertEqual(self.child.exclusive.snapshot(), (2, 3))
+
+    def test_deep_nesting(self):
+        with self.clock(0, 1, 2, 3, 4, 5):
+            with self.parent.time():
+                with self.child.time():
+                    with self.child.time():
+                        pass
+        self.assertEqual(self.parent.exclusive.snapshot(), (2,))
+        self.assertEqual(self.child.snapshot(), (1, 3))
+        self.assertEqual(self.child.exclusive.snapshot(), (1, 2))
+
+    def test_concurrent_children_are_subtracted_once(self):
+        async def child(steps):
+            with self.child.time():
+                for _ in range(steps):
+                    await asyncio.sleep(0)
+
+        async def parent():
+            with self.parent.time():
+                await asyncio.gather(child(1), child(2))
+
+        with self.clock(0, 1, 1, 4, 5, 10):
+            asyncio.run(parent())
+        self.assertEqual(self.child.snapshot(), (3, 4))
+        self.assertEqual(self.parent.exclusive.snapshot(), (6,))
+
+    def test_threads_that_copy_the_context(self):
+        def child():
+            with self.child.time():
+                pass
+
+        with self.clock(0, 2, 5, 10):
+            with self.parent.time():
+                context = contextvars.copy_context()
+                thread = threading.Thread(target=context.run, args=(child,))
+                thread.start()
+                thread.join()
+        self.assertEqual(self.parent.exclusive.snapshot(), (7,))
+
+    def test_aborted_child_is_still_subtracted(self):
+        with self.clock(0, 1, 3, 10):
+            with self.parent.time():
+                with self.child.time() as context:
+                    context.abort()
+        self.assertEqual(self.child.count, 0)
+        self.assertEqual(self.parent.exclusive.snapshot(), (8,))
+
+    def test_plain_timers_are_not_spans(self):
+        self.assertIsNone(Timer().exclusive)
+        self.assertIsNone(Timer(spans=None).exclusive)
+        self.assertIsNone(Timer(sample_every=10, spans=None).exclusive)
+        plain = Timer(Reservoir())
+        with self.clock(0, 1, 3, 10):
+            with self.parent.time():
+                with plain.time():
+                    pass
+        self.assertEqual(self.parent.exclusive.snapshot(), (10,))
+
+    def test_can_not_sample(self):
+        with self.assertRaises(ValueError):
+            Timer(sample_every=10, spans=True)
+
+
+class TestSamplingTimer(TestCase):
+
+    def setUp(self):
+        self.timer = Timer(Reservoir(), sample_every=10)
+
+    def run_timer(self, n):
+        for _ in range(n):
+            with self.timer.time():
+                pass
+
+    def test_times_one_in_n_calls(self):
+        self.run_timer(100)
+        self.assertEqual(len(self.timer.snapshot()), 10)
+
+    def test_counts_every_call(self):
+        self.run_timer(105)
+        self.assertEqual(self.timer.count, 105)
+        self.assertEqual(self.timer.meter.count, 105)
+
+    def test_skipped_calls_respect_update_flags(self):
+        for _ in range(9):
+            with self.assertRaises(ZeroDivisionError):
+                with self.timer.time(update_on_failure=False):
+                    1 / 0
+        self.assertEqual(self.timer.count, 0)
+
+    def test_skipped_calls_can_be_aborted(self):
+        for _ in range(9):
+            with self.timer.time() as context:
+                context.abort()
+        self.assertEqual(self.timer.count, 0)
+
+    def test_snapshot_is_sampled(self):
+        self.run_timer(100)
+        snapshot = self.timer.snapshot()
+        self.assertTrue(snapshot.sampled)
+        self.assertEqual(snapshot.sample_rate, 0.1)
+
+    def test_overhead_budget_adapts_sample_every(self):
+        timer = Timer(Reservoir(), overhead_budget=0.01)
+        timer._adapt(duration=1e-6, cost=1e-6)
+        self.assertEqual(timer.sample_every, 100)
+        timer._adapt(duration=1e-6, cost=1.0)
+        self.assertEqual(timer.sample_every, Timer.MAX_SAMPLE_EVERY)
+
+    def test_overhead_budget_keeps_timing_slow_code(self):
+        timer = Timer(Reservoir(), overhead_budget=0.01)
+        timer._adapt(duration=1.0, cost=1e-6)
+        self.assertEqual(timer.sample_every, 1)
+
+
 class TestGauge(TestCase):
 
     def test_gets_value(self):
@@ -149,3 +401,54 @@ class TestGauge(TestCase):
         g = Gauge()
         g.get_value = lambda: len(l)
         self.assertEqual(g.value, 3)
+
+
+class TestCachedGauge(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.gauge = CachedGauge(60)
+        self.gauge.get_value = lambda: self.calls.append(1) or len(self.calls)
+
+    def test_caches_value(self):
+        self.assertEqual(self.gauge.value, 1)
+        self.assertEqual(self.gauge.value, 1)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_reevaluates_after_ttl(self):
+        self.gauge.value
+        self.gauge._expires = datetime.now() - timedelta(seconds=1)
+        self.assertEqual(self.gauge.value, 2)
+
+    def test_invalidate(self):
+        self.gauge.value
+        self.gauge.invalidate()
+        self.assertEqual(self.gauge.value, 2)
+
+    def test_setter_updates_value(self):
+        gauge = CachedGauge(60)
+        gauge.value = 1
+        self.assertEqual(gauge.value, 1)
+        gauge.value = 2
+        self.assertEqual(gauge.value, 2)
+
+
+class TestDerivedGauge(TestCase):
+
+    def test_derives_value_from_metrics(self):
+        a, b = Counter(), Counter()
+        gauge = DerivedGauge(lambda a, b: a.count + b.count, a, b)
+        a.inc(2)
+        b.inc(3)
+        self.assertEqual(gauge.value, 5)
+
+
+class TestRatioGauge(TestCase):
+
+    def test_ratio(self):
+        gauge = RatioGauge(lambda: 1, lambda: 4)
+        self.assertEqual(gauge.value, 0.25)
+
+    def test_zero_denominator_is_nan(self):
+        gauge = RatioGauge(lambda: 1, lambda: 0)
+        self.assertNotEqual(gauge.value, gauge.value)
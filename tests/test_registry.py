@@ -0,0 +1,414 @@
+import sys
+import threading
+import time
+from timeit import default_timer
+from unittest import TestCase
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from caliper.metric import Counter, Gauge, Histogram, Meter, Timer
+from caliper.reservoir import Reservoir, SlidingWindowReservoir
+from caliper.labels import NO_LABELS, OVERFLOW_LABELS, labelset
+from caliper.registry import Registry
+
+
+class TestRegistry(TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_creates_metric(self):
+        counter = self.registry.get_or_create_metric(Counter, 'a.b')
+        self.assertIsInstance(counter, Counter)
+
+    def test_returns_existing_metric(self):
+        counter = self.registry.get_or_create_metric(Counter, 'a.b')
+        self.assertIs(self.registry.get_or_create_metric(Counter, 'a.b'), counter)
+
+    def test_same_name_different_type(self):
+        counter = self.registry.get_or_create_metric(Counter, 'a.b')
+        timer = self.registry.get_or_create_metric(Timer, 'a.b')
+        self.assertIsNot(counter, timer)
+
+    def test_anonymous_metrics_are_distinct(self):
+        a = self.registry.get_or_create_metric(Counter)
+        b = self.registry.get_or_create_metric(Counter)
+        self.assertIsNot(a, b)
+
+    def test_disallows_invalid_name(self):
+        with self.assertRaises(ValueError):
+            self.registry.get_or_create_metric(Counter, 'a..b')
+
+    def test_register(self):
+        counter = Counter()
+        self.assertIs(self.registry.register('a.b', counter), counter)
+        self.assertIs(self.registry.get_or_create_metric(Counter, 'a.b'), counter)
+
+    def test_register_existing_key(self):
+        self.registry.get_or_create_metric(Counter, 'a.b')
+        with self.assertRaises(ValueError):
+            self.registry.register('a.b', Counter())
+
+    def test_items(self):
+        counter = self.registry.get_or_create_metric(Counter, 'a.b', x=1)
+        self.assertEqual(self.registry.items(),
+                         [(('a', 'b', 'Counter'), labelset({'x': 1}), counter)])
+
+
+class TestLabels(TestCase):
+
+    def setUp(self):
+        self.registry = Registry(max_label_sets=3)
+
+    def timer(self, **labels):
+        return self.registry.get_or_create_metric(Timer, 'http.request', **labels)
+
+    def test_labelled_metrics_are_distinct(self):
+        self.assertIsNot(self.timer(handler='users'), self.timer(handler='groups'))
+        self.assertIsNot(self.timer(handler='users'), self.timer())
+
+    def test_returns_existing_labelled_metric(self):
+        self.assertIs(self.timer(handler='users', status=200),
+                      self.timer(status=200, handler='users'))
+
+    def test_label_values_are_strings(self):
+        self.assertIs(self.timer(status=200), self.timer(status='200'))
+
+    def test_constructor_arguments_are_positional(self):
+        reservoir = SlidingWindowReservoir(10)
+        histogram = self.registry.get_or_create_metric(Histogram, 'a', reservoir, x=1)
+        self.assertIs(histogram._reservoir, reservoir)
+
+    def test_disallows_labels_named_like_constructor_arguments(self):
+        with self.assertRaises(TypeError):
+            self.registry.get_or_create_metric(Timer, 'a', reservoir=Reservoir())
+        with self.assertRaises(TypeError):
+            self.registry.get_or_create_metric(Timer, None, spans=True)
+        self.assertEqual(self.registry.items(), [])
+
+    def test_labels_named_like_parameters(self):
+        timer = self.timer(name='users', cls='admin')
+        self.assertEqual(self.registry.family(Timer, 'http.request'),
+                         {labelset({'name': 'users', 'cls': 'admin'}): timer})
+        counter = Counter()
+        self.assertIs(self.registry.register('requests', counter, name='users',
+                                             metric='x'), counter)
+        self.assertEqual(list(self.registry.family(Counter, 'requests')),
+                         [labelset({'name': 'users', 'metric': 'x'})])
+
+    def test_unhashable_label_values(self):
+        counter = self.registry.get_or_create_metric(Counter, 'a', x=[1])
+        self.assertIs(self.registry.get_or_create_metric(Counter, 'a', x=[1]), counter)
+        self.assertIs(self.registry.get_or_create_metric(Counter, 'a', x='[1]'), counter)
+
+    def test_label_sets_are_interned(self):
+        self.assertIs(labelset({'a': 1, 'b': 2}), labelset({'b': '2', 'a': '1'}))
+
+    def test_disallows_invalid_label_name(self):
+        with self.assertRaises(ValueError):
+            labelset({'a-b': 1})
+
+    def test_overflow(self):
+        timers = [self.timer(handler=str(i)) for i in range(5)]
+        self.assertEqual(len(set(map(id, timers))), 4)
+        self.assertIs(timers[3], timers[4])
+        self.assertIn(OVERFLOW_LABELS, self.registry.family(Timer, 'http.request'))
+
+    def test_existing_label_sets_work_after_overflow(self):
+        first = self.timer(handler='0')
+        for i in range(5):
+            self.timer(handler=str(i))
+        self.assertIs(self.timer(handler='0'), first)
+
+    def test_family(self):
+        users = self.timer(handler='users')
+        groups = self.timer(handler='groups')
+        self.assertEqual(self.registry.family(Timer, 'http.request'),
+                         {labelset({'handler': 'users'}): users,
+                          labelset({'handler': 'groups'}): groups})
+
+    def test_group_by(self):
+        registry = Registry()
+        for handler in ('users', 'groups'):
+            for status in (200, 500):
+                registry.get_or_create_metric(Counter, 'requests', handler=handler,
+                                              status=status).inc(status)
+
+        groups = registry.group_by(Counter, 'requests', 'status')
+        self.assertEqual(sorted(groups), [('200',), ('500',)])
+        self.assertEqual(sum(c.count for c in groups[('500',)]), 1000)
+
+
+class TestCollectGauges(TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def gauge(self, name, get_value):
+        gauge = self.registry.get_or_create_metric(Gauge, name)
+        gauge.get_value = get_value
+        return gauge
+
+    def test_collects_plain_gauges(self):
+        self.registry.get_or_create_metric(Gauge, 'a').value = 42
+        self.assertEqual(self.registry.collect_gauges(), {(('a', 'Gauge'), NO_LABELS): 42})
+
+    def test_collects_callback_gauges(self):
+        self.gauge('a', lambda: 1)
+        self.gauge('b', lambda: 2)
+        self.assertEqual(self.registry.collect_gauges(),
+                         {(('a', 'Gauge'), NO_LABELS): 1, (('b', 'Gauge'), NO_LABELS): 2})
+
+    def test_runs_callbacks_concurrently(self):
+        for name in 'abcd':
+            self.gauge(name, lambda: time.sleep(0.1) or 1)
+
+        started = time.time()
+        values = self.registry.collect_gauges()
+        self.assertLess(time.time() - started, 0.3)
+        self.assertEqual(set(values.values()), {1})
+
+    def test_slow_gauge_times_out(self):
+        self.gauge('slow', lambda: time.sleep(0.5) or 1)
+        self.gauge('fast', lambda: 2)
+
+        started = time.time()
+        values = self.registry.collect_gauges(timeout=0.05, default=-1)
+        self.assertLess(time.time() - started, 0.3)
+        self.assertEqual(values, {(('slow', 'Gauge'), NO_LABELS): -1, (('fast', 'Gauge'), NO_LABELS): 2})
+
+    def test_per_gauge_timeout(self):
+        self.gauge('slow', lambda: time.sleep(0.1) or 1).timeout = 1
+        values = self.registry.collect_gauges(timeout=0.01)
+        self.assertEqual(values, {(('slow', 'Gauge'), NO_LABELS): 1})
+
+    def test_slow_gauge_is_not_resubmitted(self):
+        calls = []
+        self.gauge('slow', lambda: calls.append(1) or time.sleep(0.3))
+
+        self.registry.collect_gauges(timeout=0.01)
+        self.registry.collect_gauges(timeout=0.01)
+        self.assertEqual(len(calls), 1)
+
+    def test_failing_gauge_reports_default(self):
+        self.gauge('a', lambda: 1 / 0)
+        self.assertEqual(self.registry.collect_gauges(default=-1), {(('a', 'Gauge'), NO_LABELS): -1})
+
+
+class TestEviction(TestCase):
+
+    def setUp(self):
+        self.evicted = []
+        self.registry = Registry(idle_timeout=60, on_evict=lambda *args: self.evicted.append(args))
+        self.now = default_timer()
+
+    def counter(self, name, **labels):
+        return self.registry.get_or_create_metric(Counter, name, **labels)
+
+    def test_evicts_idle_metrics(self):
+        counter = self.counter('a')
+        self.registry.sweep(now=self.now)
+        evicted = self.registry.sweep(now=self.now + 120)
+        self.assertEqual(evicted, [(('a', 'Counter'), NO_LABELS, counter)])
+        self.assertEqual(self.evicted, evicted)
+        self.assertEqual(self.registry.items(), [])
+
+    def test_keeps_updated_metrics(self):
+        counter = self.counter('a')
+        self.registry.sweep(now=self.now)
+        counter.inc()
+        self.assertEqual(self.registry.sweep(now=self.now + 120), [])
+        self.assertEqual(self.registry.sweep(now=self.now + 150), [])
+        self.assertEqual(len(self.registry.sweep(now=self.now + 200)), 1)
+
+    def test_recreates_evicted_metric(self):
+        counter = self.counter('a', x=1)
+        self.registry.sweep(now=self.now)
+        self.registry.sweep(now=self.now + 120)
+        self.assertIsNot(self.counter('a', x=1), counter)
+        self.assertEqual(self.registry.family(Counter, 'a'),
+                         {labelset({'x': 1}): self.counter('a', x=1)})
+
+    def test_drops_cached_lookups_of_evicted_metric(self):
+        self.counter('a', x=1)
+        self.counter('a', x='1')
+        self.counter('b')
+        self.registry.sweep(now=self.now)
+        self.counter('b').inc()
+        self.registry.sweep(now=self.now + 120)
+        self.assertEqual(list(self.registry._lookup.values()), [self.counter('b')])
+
+    def test_keeps_callback_gauges(self):
+        gauge = self.registry.get_or_create_metric(Gauge, 'a')
+        gauge.get_value = lambda: 42
+        self.registry.sweep(now=self.now)
+        self.assertEqual(self.registry.sweep(now=self.now + 120), [])
+
+    def test_max_metrics_evicts_least_recently_active(self):
+        registry = Registry(max_metrics=2)
+        a = registry.get_or_create_metric(Counter, 'a')
+        b = registry.get_or_create_metric(Counter, 'b')
+        a.inc()
+        registry.sweep()
+        registry.get_or_create_metric(Counter, 'c')
+        self.assertEqual(sorted(key for key, _, _ in registry.items()),
+                         [('a', 'Counter'), ('c', 'Counter')])
+
+    def test_sweep_enforces_max_metrics(self):
+        for name in 'abc':
+            self.counter(name)
+        self.registry.max_metrics = 1
+        self.assertEqual(len(self.registry.sweep(now=self.now)), 2)
+        self.assertEqual(len(self.registry.items()), 1)
+
+    def test_concurrent_creation_and_sweeps(self):
+        registry = Registry(max_metrics=200, idle_timeout=0)
+        stop = threading.Event()
+        errors = []
+
+        def create(offset):
+            try:
+                for i in range(offset, offset + 100000):
+                    if stop.is_set():
+                        break
+                    registry.get_or_create_metric(Counter, 'requests',
+                                                  tenant=i % 500).inc()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=create, args=(i,)) for i in (0, 250)]
+        for thread in threads:
+            thread.start()
+        try:
+            for _ in range(3000):
+                registry.sweep()
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(registry._metrics), 200)
+        self.assertEqual(set(registry._activity), set(registry._metrics))
+        live = set(map(id, registry._metrics.values()))
+        self.assertTrue(all(id(metric) in live for metric in registry._lookup.values()))
+
+    def test_anonymous_metrics_are_held_weakly(self):
+        counter = self.registry.get_or_create_metric(Counter)
+        self.assertEqual(len(self.registry.items()), 1)
+        del counter
+        self.assertEqual(self.registry.items(), [])
+
+
+class TestCapture(TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def metric(self, cls, name, *args):
+        return self.registry.get_or_create_metric(cls, name, *args)
+
+    def test_captures_scalar_state(self):
+        self.metric(Counter, 'requests').inc(3)
+        self.metric(Histogram, 'size', SlidingWindowReservoir()).update(2)
+        self.metric(Timer, 'latency', SlidingWindowReservoir()).update(0.5)
+        self.metric(Meter, 'events').mark(4)
+        self.metric(Gauge, 'free').value = 7
+        callback = self.metric(Gauge, 'load')
+        callback.get_value = lambda: 1
+
+        states = dict(('.'.join(key), state)
+                      for (key, _), state in self.registry.capture().items())
+        self.assertEqual(sorted(states), ['events.Meter', 'free.Gauge', 'latency.Timer',
+                                          'requests.Counter', 'size.Histogram'])
+        self.assertEqual(states['requests.Counter'].count, 3)
+        self.assertEqual(states['size.Histogram'][:5], (1, 2, 2, 2, 2))
+        self.assertEqual(states['latency.Timer'].sum, 0.5)
+        self.assertEqual(len(states['latency.Timer'].rates), 3)
+        self.assertEqual(states['events.Meter'].count, 4)
+        self.assertEqual(states['free.Gauge'].value, 7)
+        self.assertIsNone(states['size.Histogram'].snapshot)
+
+    def test_pins_samples(self):
+        timer = self.metric(Timer, 'latency', SlidingWindowReservoir())
+        timer.update(0.5)
+        state = list(self.registry.capture(samples=True).values())[0]
+        timer.update(1.5)
+        self.assertEqual(state.snapshot, (0.5,))
+        self.assertFalse(state.snapshot.sampled)
+
+    def test_pinned_samples_of_sampling_timer(self):
+        timer = self.metric(Timer, 'latency', SlidingWindowReservoir(), 2)
+        for _ in range(4):
+            with timer.time():
+                pass
+        state = list(self.registry.capture(samples=True).values())[0]
+        self.assertEqual(state.count, 4)
+        self.assertEqual(state.snapshot.sample_rate, 0.5)
+
+    def test_restores_switch_interval(self):
+        interval = sys.getswitchinterval()
+        self.registry.capture()
+        self.assertEqual(sys.getswitchinterval(), interval)
+
+    def test_concurrent_captures_restore_switch_interval(self):
+        interval = sys.getswitchinterval()
+        self.metric(Counter, 'requests')
+        captures = [threading.Thread(target=self.registry.capture) for _ in range(3)]
+        for capture in captures:
+            capture.start()
+        for capture in captures:
+            capture.join()
+        self.assertEqual(sys.getswitchinterval(), interval)
+
+    def test_nan(self):
+        histogram = self.metric(Histogram, 'size', SlidingWindowReservoir())
+        histogram.update(1)
+        histogram.update(float('nan'))
+        state = list(self.registry.capture().values())[0]
+        self.assertEqual(state.count, 2)
+        self.assertNotEqual(state.variance, state.variance)
+
+    def test_gives_up_on_timeout(self):
+        interval = sys.getswitchinterval()
+        self.metric(Counter, 'requests')
+        with patch('caliper.registry._writing', return_value=True):
+            with self.assertRaises(RuntimeError):
+                self.registry.capture(timeout=0.01)
+        self.assertEqual(sys.getswitchinterval(), interval)
+
+    def test_consistent_under_concurrent_writers(self):
+        first = self.metric(Counter, 'first')
+        timer = self.metric(Timer, 'latency', SlidingWindowReservoir(10))
+        second = self.metric(Counter, 'second')
+        stop = threading.Event()
+
+        def write():
+            while not stop.is_set():
+                first.inc()
+                timer.update(1.0)
+                second.inc()
+
+        writers = [threading.Thread(target=write) for _ in range(2)]
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for writer in writers:
+                writer.start()
+            states = [self.registry.capture(samples=True) for _ in range(200)]
+        finally:
+            stop.set()
+            for writer in writers:
+                writer.join()
+            sys.setswitchinterval(interval)
+
+        for captured in states:
+            captured = dict(('.'.join(key), state) for (key, _), state in captured.items())
+            f, t, s = (captured['first.Counter'], captured['latency.Timer'],
+                       captured['second.Counter'])
+            self.assertTrue(s.count <= t.count <= f.count <= s.count + 2)
+            self.assertEqual(t.sum, float(t.count))
+            self.assertEqual(len(t.snapshot), min(t.count, 10))
+            if t.count:
+                self.assertEqual((t.min, t.max, t.mean), (1.0, 1.0, 1.0))
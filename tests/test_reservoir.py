@@ -1,6 +1,8 @@
 
 from datetime import datetime, timedelta
 from math import exp
+from random import Random
+from statistics import mean, stdev
 
 from unittest import TestCase
 try:
@@ -8,7 +10,8 @@ try:
 except ImportError:
     from mock import Mock, patch
 
-from caliper.reservoir import Reservoir, SlidingWindowReservoir, UniformReservoir, ExponentiallyDecayingReservoir
+from caliper.reservoir import Reservoir, SlidingWindowReservoir, UniformReservoir, ExponentiallyDecayingReservoir, \
+    LogExponentiallyDecayingReservoir
 
 
 class TestReservoir(TestCase):
@@ -70,6 +73,49 @@ class TestUniformReservoir(TestCase):
     def setUp(self):
         self.res = UniformReservoir(15)
 
+    def test_merge_is_proportional(self):
+        rng = Random(42)
+        from_small = 0
+        for _ in range(200):
+            a, b = UniformReservoir(100, rng=rng), UniformReservoir(100, rng=rng)
+            for i in range(1000):
+                a.update(0)
+            for i in range(3000):
+                b.update(1)
+            a.merge(b)
+            self.assertEqual(len(a), 4000)
+            self.assertEqual(len(a._res), 100)
+            self.assertEqual(a._sum, sum(a._res))
+            from_small += a._res.count(0)
+        self.assertAlmostEqual(from_small / 20000.0, 0.25, delta=0.01)
+
+    def test_merge_keeps_sampling(self):
+        a, b = UniformReservoir(10, rng=Random(1)), UniformReservoir(10, rng=Random(2))
+        for i in range(100):
+            a.update(i)
+            b.update(i)
+        a.merge(b)
+        self.assertTrue(a._next >= a._count)
+        for i in range(1000):
+            a.update(i)
+        self.assertEqual(len(a), 1200)
+        self.assertEqual(len(a._res), 10)
+
+    def test_merge_partially_filled(self):
+        a, b = UniformReservoir(10), UniformReservoir(10)
+        for i in range(3):
+            a.update(i)
+            b.update(i + 3)
+        a.merge(b)
+        self.assertEqual(sorted(a.values()), list(range(6)))
+        for i in range(10):
+            a.update(i)
+        self.assertEqual(len(a._res), 10)
+
+    def test_merge_different_sizes(self):
+        with self.assertRaises(ValueError):
+            self.res.merge(UniformReservoir(10))
+
     def test_add_15_elements(self):
         for i in range(15):
             self.res.update(i)
@@ -81,49 +127,52 @@ class TestUniformReservoir(TestCase):
         self.assertEqual(len(self.res), 30)
         self.assertEqual(len(self.res._res), 15)
 
-    @patch('caliper.reservoir.randint')
-    def test_randint_called_with_count_minus_one(self, randint):
+    def test_same_seed_gives_same_sample(self):
+        a = UniformReservoir(15, rng=Random(42))
+        b = UniformReservoir(15, rng=Random(42))
+        for i in range(1000):
+            a.update(i)
+            b.update(i)
+        self.assertEqual(a._res, b._res)
+
+    def test_no_random_numbers_drawn_between_replacements(self):
         for i in range(15):
             self.res.update(i)
 
-        randint.return_value = 1
-
-        self.res.update(42)
+        self.res._rng = Mock(wraps=self.res._rng)
+        while self.res._count < self.res._next:
+            self.res.update(42)
+        self.res._rng.random.assert_not_called()
+        self.assertNotIn(42, self.res._res)
 
-        randint.assert_called_once_with(0, 14)
+        self.res.update(1337)
+        self.assertIn(1337, self.res._res)
+        self.assertTrue(self.res._next >= self.res._count)
 
-    @patch('caliper.reservoir.randint')
-    def test_full_reservoir_insert_in_correct_position(self, randint):
-        for _ in range(15):
-            self.res.update(0)
+    def test_replaces_value_at_random_index(self):
+        for i in range(15):
+            self.res.update(i)
+        self.res._next = 15
+        self.res._rng = Mock()
+        self.res._rng.random.side_effect = [5 / 15.0, 0.5, 0.5]
 
-        randint.return_value = 5
         self.res.update(42)
-        randint.assert_called_once_with(0, 14)
-        self.assertEqual(self.res._res[5], 42)
-        randint.reset_mock()
 
-        randint.return_value = 0
-        self.res.update(21)
-        randint.assert_called_once_with(0, 15)
-        self.assertEqual(self.res._res[0], 21)
-        randint.reset_mock()
-
-        randint.return_value = 14
-        self.res.update(1337)
-        randint.assert_called_once_with(0, 16)
-        self.assertEqual(self.res._res[-1], 1337)
-        randint.reset_mock()
+        self.assertEqual(self.res._res[5], 42)
+        self.assertEqual(len(self.res._res), 15)
 
-    def test_full_reservoir_ignores_index_too_large(self):
-        for _ in range(30):
-            self.res.update(0)
+    def test_sample_is_uniform(self):
+        rng = Random(1)
+        hits = [0] * 100
+        for _ in range(2000):
+            res = UniformReservoir(10, rng=rng)
+            for i in range(100):
+                res.update(i)
+            for i in res._res:
+                hits[i] += 1
 
-        with patch('caliper.reservoir.randint') as randint:
-            randint.return_value = 20
-            self.res.update(42)
-            randint.assert_called_once_with(0, 29)
-            self.assertFalse(42 in self.res._res)
+        # Every value is expected in the sample 2000 * 10 / 100 = 200 times.
+        self.assertTrue(all(140 < h < 260 for h in hits), hits)
 
 
 class TestExponentiallyDecayingReservoir(TestCase):
@@ -157,6 +206,16 @@ class TestExponentiallyDecayingReservoir(TestCase):
         self.assertEqual(len(self.res), 30)
         self.assertEqual(len(self.res._res), 15)
 
+    def test_same_seed_gives_same_sample(self):
+        a = ExponentiallyDecayingReservoir(15, rng=Random(42))
+        b = ExponentiallyDecayingReservoir(15, rng=Random(42))
+        now = datetime.now() + timedelta(seconds=1)
+        for i in range(100):
+            a.update(i, now)
+            b.update(i, now)
+        self.assertEqual(sorted(v for v, _ in a._res.values()),
+                         sorted(v for v, _ in b._res.values()))
+
     def test_add_to_full_reservoir(self):
         self.res._res = {i: (i, i) for i in range(15)}
 
@@ -168,15 +227,15 @@ class TestExponentiallyDecayingReservoir(TestCase):
         with patch.object(self.res, '_rescale_if_needed') as _rin, \
                 patch.object(self.res, '_rescale') as _rescale, \
                 patch.object(self.res, '_sample_weight') as _sample_weight, \
-                patch('caliper.reservoir.random') as random:
-            random.return_value = 0.5
+                patch.object(self.res, '_rng') as rng:
+            rng.random.return_value = 0.5
             _sample_weight.return_value = 20
 
             self.res.update(42)
 
             _rin.assert_called_once_with()
             _rescale.assert_not_called()
-            random.assert_called_once_with()
+            rng.random.assert_called_once_with()
 
         for k, (v, w) in self.res._res.items():
             if v == 42:
@@ -212,3 +271,137 @@ class TestExponentiallyDecayingReservoir(TestCase):
         expected = {0.5 * i: (i, i) for i in range(15)}
         self.assertEqual(self.res._res, expected)
 
+
+class TestLogExponentiallyDecayingReservoir(TestCase):
+
+    def setUp(self):
+        self.res = LogExponentiallyDecayingReservoir(15)
+
+    def test_add_15_elements(self):
+        for i in range(15):
+            self.res.update(i)
+        self.assertEqual(len(self.res), 15)
+
+    def test_add_30_elements(self):
+        for i in range(30):
+            self.res.update(i)
+        self.assertEqual(len(self.res), 30)
+        self.assertEqual(len(self.res._res), 15)
+
+    def test_empty_snapshot(self):
+        self.assertEqual(len(self.res.snapshot()), 0)
+
+    def test_keeps_samples_with_highest_priority(self):
+        now = datetime.now() + timedelta(seconds=1)
+        self.res._rng = Mock()
+        self.res._rng.random.side_effect = [0.5] * 15 + [0.1, 0.9]
+        for i in range(15):
+            self.res.update(i, now)
+
+        self.res.update(42, now)
+        self.res.update(1337, now)
+
+        values = [v for _, v, _ in self.res._res]
+        self.assertIn(42, values)
+        self.assertNotIn(1337, values)
+
+    def test_does_not_overflow(self):
+        later = self.res._landmark + timedelta(days=3650)
+        for i in range(30):
+            self.res.update(i, later + timedelta(seconds=i))
+
+        snap = self.res.snapshot()
+        self.assertEqual(len(snap), 15)
+        self.assertAlmostEqual(sum(snap._normweights), 1.0)
+
+    def test_same_snapshot_as_exponentially_decaying_reservoir(self):
+        edr = ExponentiallyDecayingReservoir(15, rng=Random(42))
+        log = LogExponentiallyDecayingReservoir(15, rng=Random(42))
+        log._landmark = edr._landmark
+
+        for i in range(200):
+            stamp = edr._landmark + timedelta(seconds=1 + i)
+            edr.update(i, stamp)
+            log.update(i, stamp)
+
+        expected = edr.snapshot()
+        snap = log.snapshot()
+        self.assertEqual(tuple(snap), tuple(expected))
+        for w, e in zip(snap._normweights, expected._normweights):
+            self.assertAlmostEqual(w, e)
+
+
+class TestMerge(TestCase):
+
+    def test_reservoir(self):
+        a, b = Reservoir(), Reservoir()
+        a.update(1)
+        b.update(2)
+        a.merge(b)
+        self.assertEqual(a.snapshot(), (1, 2))
+        self.assertEqual(a.summary().mean, 1.5)
+
+    def test_not_mergeable(self):
+        with self.assertRaises(NotImplementedError):
+            SlidingWindowReservoir().merge(SlidingWindowReservoir())
+
+
+class TestSummary(TestCase):
+
+    def fill(self, res, n=1000, offset=0):
+        rng = Random(42)
+        for _ in range(n):
+            res.update(offset + rng.random())
+        return res
+
+    def assert_sum(self, res):
+        self.assertAlmostEqual(res._sum + res._shift * len(res._res), sum(res._res))
+
+    def assert_summary_matches_snapshot(self, res):
+        snap = res.snapshot()
+        summary = res.summary((0.5, 0.99))
+        self.assertEqual(summary.get_value(0.99), snap.get_value(0.99))
+        self.assertEqual(summary.get_value(0.5), snap.get_value(0.5))
+        self.assertAlmostEqual(summary.mean, snap.mean)
+        self.assertAlmostEqual(summary.stddev, snap.stddev)
+
+    def test_reservoir(self):
+        self.assert_summary_matches_snapshot(self.fill(Reservoir()))
+
+    def test_sliding_window_reservoir(self):
+        res = self.fill(SlidingWindowReservoir(100), 5000)
+        self.assert_sum(res)
+        self.assert_summary_matches_snapshot(res)
+
+    def test_sliding_window_reservoir_resums(self):
+        res = SlidingWindowReservoir(10)
+        res.update(1e17)
+        for _ in range(10 * SlidingWindowReservoir.RESUM_INTERVAL):
+            res.update(1)
+        summary = res.summary()
+        self.assertEqual((summary.mean, summary.stddev), (1, 0))
+
+    def test_uniform_reservoir(self):
+        res = self.fill(UniformReservoir(100, rng=Random(1)), 5000)
+        self.assert_sum(res)
+        self.assert_summary_matches_snapshot(res)
+
+    def test_large_values(self):
+        for res in (Reservoir(), SlidingWindowReservoir(100),
+                    UniformReservoir(100, rng=Random(1))):
+            self.fill(res, 5000, offset=1.7e9)
+            summary = res.summary()
+            self.assertAlmostEqual(summary.stddev, stdev(res.values()), places=6)
+            self.assertAlmostEqual(summary.mean, mean(res.values()), places=6)
+
+    def test_exponentially_decaying_reservoirs(self):
+        self.assert_summary_matches_snapshot(self.fill(ExponentiallyDecayingReservoir(100)))
+        self.assert_summary_matches_snapshot(
+            self.fill(LogExponentiallyDecayingReservoir(100)))
+
+    def test_values(self):
+        for res in (Reservoir(), SlidingWindowReservoir(10), UniformReservoir(10),
+                    ExponentiallyDecayingReservoir(10), LogExponentiallyDecayingReservoir(10)):
+            for i in range(5):
+                res.update(i)
+            self.assertEqual(sorted(res.values()), list(range(5)))
@@ -1,7 +1,12 @@
 
+from random import Random
 from unittest import TestCase
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
 
-from caliper.snapshot import Snapshot, WeightedSnapshot
+from caliper.snapshot import Snapshot, WeightedSnapshot, summarize
 
 
 class TestSnapshot(TestCase):
@@ -52,6 +57,9 @@ class TestSnapshot(TestCase):
     def test_calculates_the_stddev(self):
         self.assertAlmostEqual(self.snap.stddev, 1.5811, places=4)
 
+    def test_caches_the_mean(self):
+        self.assertIs(self.snap.mean, self.snap.mean)
+
     def test_calculates_a_stddev_of_zero_for_empty_snapshot(self):
         snap = WeightedSnapshot([])
         self.assertEqual(snap.stddev, 0)
@@ -114,3 +122,61 @@ class TestWeightedSnapshot(TestCase):
     def test_calculates_a_stddev_of_zero_for_snapshot_of_one_item(self):
         snap = WeightedSnapshot([(1, 1)])
         self.assertEqual(snap.stddev, 0)
+
+
+class TestSummarize(TestCase):
+
+    QUANTILES = (0, 0.001, 0.01, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 1)
+
+    def assert_matches_snapshot(self, values, quantiles):
+        snap = Snapshot(values)
+        summary = summarize(values, quantiles)
+        self.assertEqual(len(summary), len(snap))
+        for q in quantiles:
+            self.assertAlmostEqual(summary.get_value(q), snap.get_value(q))
+        self.assertEqual(summary.min, min(snap))
+        self.assertEqual(summary.max, max(snap))
+        self.assertAlmostEqual(summary.mean, snap.mean)
+        self.assertAlmostEqual(summary.stddev, snap.stddev)
+
+    def test_matches_snapshot(self):
+        rng = Random(42)
+        for n in (1, 2, 3, 10, 100, 1000, 5000):
+            values = [rng.random() for _ in range(n)]
+            self.assert_matches_snapshot(values, self.QUANTILES)
+
+    def test_tail_quantiles_match_snapshot(self):
+        rng = Random(42)
+        values = [rng.lognormvariate(0, 1) for _ in range(5000)]
+        self.assert_matches_snapshot(values, (0.99, 0.999))
+        self.assert_matches_snapshot(values, (0.001, 0.99))
+
+    def test_does_not_sort_for_tail_quantiles(self):
+        values = list(range(1000))
+        with patch('caliper.snapshot.sorted', create=True) as sorted_:
+            summarize(values, (0.99, 0.999))
+            sorted_.assert_not_called()
+
+    def test_uses_given_moments(self):
+        summary = summarize([1, 2, 3], (0.5,), total=60, total_squares=1400)
+        self.assertEqual(summary.mean, 20)
+        self.assertEqual(summary.stddev, 10)
+
+    def test_empty(self):
+        summary = summarize([], (0.5, 0.99))
+        self.assertEqual(len(summary), 0)
+        self.assertEqual(summary.get_value(0.99), 0)
+
+    def test_disallows_missing_quantile(self):
+        with self.assertRaises(ValueError):
+            summarize([1, 2, 3], (0.5,)).get_value(0.99)
+
+    def test_disallows_invalid_quantile(self):
+        with self.assertRaises(ValueError):
+            summarize([1, 2, 3], (1.5,))
+
+    def test_snapshot_summary(self):
+        snap = WeightedSnapshot(zip([5, 1, 2, 3, 4], [1, 2, 3, 2, 2]))
+        summary = snap.summary((0.75,))
+        self.assertEqual(summary.get_value(0.75), 4)
+        self.assertEqual(summary.mean, snap.mean)